@@ -1,369 +1,350 @@
-from typing import Any, List, Dict, Tuple, Optional
+import copy
+import hashlib
+import importlib.metadata as importlib_metadata
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, ClassVar, List, Dict, Tuple, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from threading import Event as ThreadEvent
+from functools import lru_cache
+from threading import Event as ThreadEvent, Lock, get_ident
+from urllib.parse import quote
 
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from app.core.config import settings
 from app.log import logger
 from app.plugins import _PluginBase
 from app.schemas.types import NotificationType
-from app.helper.mediaserver import MediaServerHelper
 
+try:
+    # orjson 可选：直接输出/解析 bytes，省去编码解码的中间拷贝
+    import orjson
+
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+except ImportError:
+    import json
+
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode('utf-8')
+
+    _json_loads = json.loads
+
+if TYPE_CHECKING:
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.triggers.cron import CronTrigger
 
-class PlexTraktSync(_PluginBase):
-    # 插件名称
-    plugin_name = "Plex Trakt 同步"
-    # 插件描述
-    plugin_desc = "同步 Plex 观看记录到 Trakt"
-    # 插件图标
-    plugin_icon = "https://raw.githubusercontent.com/jxxghp/MoviePilot-Plugins/main/icons/trakt.png"
-    # 插件版本
-    plugin_version = "2.4.0"
-    # 插件作者
-    plugin_author = "PlexTraktSync"
-    # 作者主页
-    author_url = "https://github.com/Taxel/PlexTraktSync"
-    # 插件配置项ID前缀
-    plugin_config_prefix = "plextraktsync_"
-    # 加载顺序
-    plugin_order = 15
-    # 可使用的用户级别
-    auth_level = 2
-    # 启用数据页面
-    plugin_page = True
-
-    # 私有属性
-    _enabled = False
-    _onlyonce = False
-    _cron = None
-    _notify = False
-
-    # Plex 配置将从 MoviePilot 系统配置中获取
-    _plex_libraries = None
-
-    # Trakt 配置
-    _trakt_client_id = None
-    _trakt_client_secret = None
-    _trakt_username = None
-    _trakt_access_token = None  # OAuth Access Token
-    _trakt_pin_code = None  # 用户输入的 PIN 码，用于换取 Token
-
-    # 同步选项
-    _sync_movies = True
-    _sync_shows = True
-    _sync_watched = True
-    _sync_ratings = True
-    _sync_collection = True
-    _sync_watchlist = False
-
-    # 高级选项
-    _two_way_sync = False
-    _sync_from_trakt = False
-    _skip_already_synced = True
-    _batch_size = 100
-
-    # 定时器
-    _scheduler: Optional[BackgroundScheduler] = None
-    _event = ThreadEvent()
-
-    def init_plugin(self, config: dict = None):
-        """
-        初始化插件
-        """
-        # 停止现有任务
-        self.stop_service()
-
-        if config:
-            self._enabled = config.get("enabled", False)
-            self._onlyonce = config.get("onlyonce", False)
-            self._cron = config.get("cron", "0 2 * * *")
-            self._notify = config.get("notify", False)
-
-            # Plex 配置从系统设置获取
-            self._plex_libraries = config.get("plex_libraries", "")
-
-            # Trakt 配置
-            self._trakt_client_id = config.get("trakt_client_id", "")
-            self._trakt_client_secret = config.get("trakt_client_secret", "")
-            self._trakt_username = config.get("trakt_username", "")
-            self._trakt_access_token = config.get("trakt_access_token", "")
-            self._trakt_pin_code = config.get("trakt_pin_code", "")
-            
-            # 如果有 PIN 码但没有 Token，尝试换取 Token
-            if self._trakt_pin_code and not self._trakt_access_token:
-                logger.info("检测到 PIN 码，尝试换取 Access Token...")
-                token = self._exchange_pin_for_token(self._trakt_pin_code)
-                if token:
-                    self._trakt_access_token = token
-                    # 保存 Token 到配置并清空 PIN 码
-                    config['trakt_access_token'] = token
-                    config['trakt_pin_code'] = ""  # 清空 PIN 码
-                    self.update_config(config)
-                    logger.info("✓ 成功换取并保存 Access Token")
-                else:
-                    logger.error("✗ PIN 码换取 Token 失败")
 
-            # 同步选项
-            self._sync_movies = config.get("sync_movies", True)
-            self._sync_shows = config.get("sync_shows", True)
-            self._sync_watched = config.get("sync_watched", True)
-            self._sync_ratings = config.get("sync_ratings", True)
-            self._sync_collection = config.get("sync_collection", True)
-            self._sync_watchlist = config.get("sync_watchlist", False)
+# Trakt OAuth 常量
+TRAKT_TOKEN_URL = "https://api.trakt.tv/oauth/token"
+TRAKT_REDIRECT_URI = "urn:ietf:wg:oauth:2.0:oob"
+TRAKT_GRANT_TYPE = "authorization_code"
+TRAKT_AUTHORIZE_URL = "https://trakt.tv/oauth/authorize"
+
+# 剧集匹配使用的 ID 类型，按优先级排列
+SHOW_GUID_SCHEMES = ('tvdb', 'tmdb', 'imdb')
+
+# 从 Plex GUID 中提取的外部 ID 类型
+GUID_SCHEMES = frozenset(('imdb', 'tmdb', 'tvdb'))
+
+# 电影匹配使用的 ID 类型，对应 Plex GUID 的 imdb://、tmdb:// 前缀
+MOVIE_GUID_SCHEMES = ('imdb', 'tmdb')
+
+# 旧版 Plex 代理的 GUID，如 com.plexapp.agents.imdb://tt0111161?lang=en，这类条目没有 guids 列表
+_LEGACY_GUID_RE = re.compile(r'com\.plexapp\.agents\.(imdb|thetvdb|themoviedb)://([^?/]+)')
+_LEGACY_GUID_SCHEMES = {'imdb': 'imdb', 'thetvdb': 'tvdb', 'themoviedb': 'tmdb'}
+
+# 同步循环中每处理多少个条目输出一次进度
+PROGRESS_LOG_INTERVAL = 500
+
+# Trakt 列表接口对应的 sync/last_activities 字段，时间戳未变化时直接使用本地缓存
+TRAKT_ACTIVITY_FIELDS = {
+    'sync/watched/movies': ('movies', 'watched_at'),
+    'sync/ratings/movies': ('movies', 'rated_at'),
+    'sync/watched/shows': ('episodes', 'watched_at'),
+    'sync/ratings/shows': ('shows', 'rated_at'),
+    'sync/ratings/episodes': ('episodes', 'rated_at'),
+}
+
+# 同步方向
+SYNC_TO_PLEX = "to_plex"
+SYNC_TO_TRAKT = "to_trakt"
+SYNC_BOTH = "both"
+
+# Token 验证通过后的有效期（秒），期间同步不再重复调用 /users/settings
+TOKEN_VERIFY_TTL = 3600
+
+# 读取 Plex 媒体库时每页的条目数，大库分页拉取，避免单个超大 XML 响应
+# 列表请求同时带上 includeGuids，外部 ID 随列表返回，不必逐条 reload
+PLEX_CONTAINER_SIZE = 500
+
+# Trakt 写接口限速约每秒 1 次，两次 sync/history 提交之间的最小间隔（秒）
+TRAKT_POST_INTERVAL = 1.0
+
+# 每批提交到 Trakt 的电影数或单集数上限，配置的批量处理大小限制在 1 到此值之间
+TRAKT_MAX_BATCH_SIZE = 1000
+
+# PIN 码无效时的排查提示，一次性输出；%s 为授权链接
+_INVALID_GRANT_HINT = "\n".join((
+    "",
+    "PIN 码无效或已过期！",
+    "",
+    "常见原因:",
+    "1. PIN 码已被使用过（每个 PIN 码只能使用一次）",
+    "2. PIN 码已过期（通常 10 分钟内有效）",
+    "3. Client ID/Secret 不正确",
+    "",
+    "解决方法:",
+    "1. 访问新的授权 URL 获取新 PIN 码:",
+    "   %s",
+    "2. 在授权页面点击「Authorize」",
+    "3. 复制新的 PIN 码（注意不要有空格）",
+    "4. 粘贴到插件配置并立即保存",
+    "",
+))
+
+
+# MediaServerHelper 类对象，首次使用时导入
+_media_server_helper_cls = None
+
+
+def _media_server_helper() -> Any:
+    """
+    创建 MediaServerHelper 实例，模块在首次调用时才导入
+    """
+    global _media_server_helper_cls
+    if _media_server_helper_cls is None:
+        from app.helper.mediaserver import MediaServerHelper
+        _media_server_helper_cls = MediaServerHelper
+    return _media_server_helper_cls()
+
+
+def _episode_key(season: int, number: int) -> int:
+    """
+    单集键：季号和集号打包成一个整数，比 SxxEyy 字符串更省内存、哈希更快
+    """
+    return (season << 16) | number
+
+
+def _episode_label(key: int) -> str:
+    """
+    单集键转换为 SxxEyy 形式，仅用于日志
+    """
+    return f"S{key >> 16:02d}E{key & 0xFFFF:02d}"
+
+
+def _run_in_background(func, *args, **kwargs) -> Future:
+    """
+    在后台线程中执行 func，用于让 Plex 列表请求与 Trakt 请求同时进行
+    """
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        return executor.submit(func, *args, **kwargs)
+    finally:
+        # 已提交的任务照常执行完，线程随后自行退出
+        executor.shutdown(wait=False)
+
+
+def _plex_guid_ids(item) -> List[str]:
+    """
+    Plex 条目的外部 ID GUID 列表（scheme://id）
+    新版代理从 guids 读取；旧版代理只有 guid 字段，从中解析
+    """
+    guids = item.guids
+    if guids:
+        return [guid.id for guid in guids]
+    # 未匹配的条目（plex://、local:// 等）直接返回，不进入正则
+    legacy_guid = item.guid or ''
+    if not legacy_guid.startswith('com.plexapp.agents.'):
+        return []
+    guid_id = _parse_legacy_guid(legacy_guid)
+    return [guid_id] if guid_id else []
+
+
+@lru_cache(maxsize=4096)
+def _parse_legacy_guid(legacy_guid: str) -> Optional[str]:
+    """
+    旧版代理 GUID 转换为 scheme://id，纯函数，结果跨同步复用
+    """
+    match = _LEGACY_GUID_RE.match(legacy_guid)
+    if match:
+        return f"{_LEGACY_GUID_SCHEMES[match.group(1)]}://{match.group(2)}"
+    return None
+
+
+def _primary_guid(ids: dict, schemes: Tuple[str, ...]) -> Optional[str]:
+    """
+    按 schemes 的优先级取第一个存在的 ID，返回 scheme://id 形式的 GUID
+    """
+    for scheme in schemes:
+        value = ids.get(scheme)
+        if value:
+            return f"{scheme}://{value}"
+    return None
+
+
+def _history_batches(media_type: str, items: List[dict], batch_size: int):
+    """
+    将观看记录切分为批次
+    电影按条数切分；剧集按单集数切分，单集过多的剧集拆到多个批次，每批单集数不超过 batch_size
+    """
+    if media_type != 'shows':
+        for start in range(0, len(items), batch_size):
+            yield items[start:start + batch_size]
+        return
+    batch, count = [], 0
+    for show in items:
+        seasons = []
+        for season in show['seasons']:
+            episodes = season['episodes']
+            while episodes:
+                part, episodes = episodes[:batch_size - count], episodes[batch_size - count:]
+                seasons.append({'number': season['number'], 'episodes': part})
+                count += len(part)
+                if count >= batch_size:
+                    batch.append({'ids': show['ids'], 'seasons': seasons})
+                    yield batch
+                    batch, count, seasons = [], 0, []
+        if seasons:
+            batch.append({'ids': show['ids'], 'seasons': seasons})
+    if batch:
+        yield batch
+
+
+# 所有 sync/history 提交（包括并行同步的多个媒体库）串行执行并保持间隔
+_trakt_post_lock = Lock()
+_trakt_last_post = 0.0
+
+
+def _post_trakt_history(session: requests.Session, stop_event: ThreadEvent, body: dict,
+                        headers: dict) -> Optional[requests.Response]:
+    """
+    提交一次 sync/history，与上一次提交至少间隔 TRAKT_POST_INTERVAL 秒
+    等待期间插件停止时返回 None
+    """
+    global _trakt_last_post
+    with _trakt_post_lock:
+        delay = _trakt_last_post + TRAKT_POST_INTERVAL - time.monotonic()
+        if delay > 0 and stop_event.wait(delay):
+            return None
+        try:
+            return session.post(
+                "https://api.trakt.tv/sync/history",
+                data=_json_dumps(body),
+                headers=headers,
+                timeout=60
+            )
+        finally:
+            _trakt_last_post = time.monotonic()
+
 
-            # 高级选项
-            self._two_way_sync = config.get("two_way_sync", False)
-            self._sync_from_trakt = config.get("sync_from_trakt", False)
-            self._skip_already_synced = config.get("skip_already_synced", True)
-            self._batch_size = config.get("batch_size", 100)
+class _ErrorLog:
+    """
+    逐条目错误日志限额：超过上限后不再逐条输出，避免同一个问题刷屏
+    """
 
-            # 启动定时任务
-            if self._enabled or self._onlyonce:
-                self._scheduler = BackgroundScheduler(timezone=settings.TZ)
+    def __init__(self, limit: int = 10):
+        self._remaining = limit
 
-                if self._onlyonce:
-                    logger.info("Plex Trakt 同步服务，立即运行一次")
-                    self._scheduler.add_job(
-                        func=self.__sync_task,
-                        trigger='date',
-                        run_date=datetime.now(),
-                        name="Plex Trakt 同步"
-                    )
-                    # 关闭一次性开关
-                    self._onlyonce = False
-                    self.update_config({
-                        **config,
-                        "onlyonce": False
-                    })
+    def error(self, msg: str, *args: Any):
+        if self._remaining > 0:
+            logger.error(msg, *args)
+        elif self._remaining == 0:
+            logger.error("错误过多，后续同类错误不再逐条输出")
+        else:
+            return
+        self._remaining -= 1
 
-                if self._enabled and self._cron:
-                    try:
-                        self._scheduler.add_job(
-                            func=self.__sync_task,
-                            trigger=CronTrigger.from_crontab(self._cron),
-                            name="Plex Trakt 同步"
-                        )
-                        logger.info(f"Plex Trakt 同步定时任务已启动，执行周期：{self._cron}")
-                    except Exception as e:
-                        logger.error(f"定时任务配置错误：{str(e)}")
 
-                if self._scheduler.get_jobs():
-                    self._scheduler.print_jobs()
-                    self._scheduler.start()
+# pytrakt 的认证信息是模块级全局变量，只导入一次，凭据变化时才重新写入
+_trakt_lock = Lock()
+_trakt_credentials: Optional[Tuple[str, str, str]] = None
 
-    def get_state(self) -> bool:
-        """
-        获取插件状态
-        """
-        return self._enabled
 
-    @staticmethod
-    def get_command() -> List[Dict[str, Any]]:
-        """
-        定义远程控制命令
-        """
-        pass
+def _configure_trakt(client_id: str, client_secret: str, access_token: str,
+                     session: requests.Session) -> bool:
+    """
+    写入 pytrakt 认证信息并让其复用插件的连接池
+    :return: 本次是否实际更新了配置
+    """
+    global _trakt_credentials
+    credentials = (client_id, client_secret, access_token)
+    with _trakt_lock:
+        import trakt.core
+        if _trakt_credentials == credentials:
+            return False
+        trakt.core.CLIENT_ID = client_id
+        trakt.core.CLIENT_SECRET = client_secret
+        trakt.core.OAUTH_TOKEN = access_token
+        if hasattr(trakt.core, 'session'):
+            trakt.core.session = session
+        # 新版 pytrakt 会缓存配置和 API 客户端，凭据变化后需要重建
+        for name in ('config', 'api'):
+            cache_clear = getattr(getattr(trakt.core, name, None), 'cache_clear', None)
+            if cache_clear:
+                cache_clear()
+        _trakt_credentials = credentials
+        return True
 
-    def get_api(self) -> List[Dict[str, Any]]:
-        """
-        获取插件API
-        """
-        return [
-            {
-                "path": "/get_auth_url",
-                "endpoint": self.get_auth_url,
-                "methods": ["GET"],
-                "summary": "获取 Trakt 授权 URL",
-                "description": "生成 Trakt OAuth 授权链接"
-            },
-            {
-                "path": "/exchange_pin",
-                "endpoint": self.exchange_pin,
-                "methods": ["POST"],
-                "summary": "使用 PIN 码换取 Access Token",
-                "description": "将用户授权的 PIN 码换取 Access Token"
-            }
-        ]
-    
-    def get_auth_url(self) -> dict:
-        """生成 Trakt 授权 URL"""
-        try:
-            if not self._trakt_client_id:
-                return {
-                    "success": False,
-                    "message": "请先配置 Trakt Client ID"
-                }
-            
-            import urllib.parse
-            auth_url = (
-                f"https://trakt.tv/oauth/authorize"
-                f"?response_type=code"
-                f"&client_id={urllib.parse.quote(self._trakt_client_id)}"
-                f"&redirect_uri=urn:ietf:wg:oauth:2.0:oob"
-            )
-            
-            return {
-                "success": True,
-                "auth_url": auth_url,
-                "message": "请在浏览器中打开此链接并授权"
-            }
-        except Exception as e:
-            logger.error(f"生成授权 URL 失败: {str(e)}")
-            return {
-                "success": False,
-                "message": f"生成授权 URL 失败: {str(e)}"
-            }
-    
-    def exchange_pin(self, pin_code: str) -> dict:
-        """使用 PIN 码换取 Access Token"""
-        try:
-            if not self._trakt_client_id or not self._trakt_client_secret:
-                return {
-                    "success": False,
-                    "message": "请先配置 Trakt Client ID 和 Client Secret"
-                }
-            
-            if not pin_code:
-                return {
-                    "success": False,
-                    "message": "PIN 码不能为空"
-                }
-            
-            import json
-            import urllib.request
-            
-            # 构造请求
-            url = "https://api.trakt.tv/oauth/token"
-            data = {
-                "code": pin_code.strip(),
-                "client_id": self._trakt_client_id,
-                "client_secret": self._trakt_client_secret,
-                "redirect_uri": "urn:ietf:wg:oauth:2.0:oob",
-                "grant_type": "authorization_code"
-            }
-            
-            # 发送 POST 请求
-            req = urllib.request.Request(
-                url,
-                data=json.dumps(data).encode('utf-8'),
-                headers={'Content-Type': 'application/json'}
-            )
-            
-            with urllib.request.urlopen(req, timeout=10) as response:
-                result = json.loads(response.read().decode('utf-8'))
-            
-            access_token = result.get('access_token')
-            refresh_token = result.get('refresh_token')
-            
-            if not access_token:
-                return {
-                    "success": False,
-                    "message": "未能获取 Access Token"
-                }
-            
-            # 自动保存 Token 到配置
-            config = self.get_config()
-            config['trakt_access_token'] = access_token
-            self.update_config(config)
-            self._trakt_access_token = access_token
-            
-            logger.info("✓ 成功获取并保存 Trakt Access Token")
-            
-            return {
-                "success": True,
-                "access_token": access_token,
-                "refresh_token": refresh_token,
-                "message": "✓ 成功获取 Access Token！已自动保存到配置中"
-            }
-            
-        except urllib.error.HTTPError as e:
-            error_msg = e.read().decode('utf-8') if hasattr(e, 'read') else str(e)
-            logger.error(f"换取 Token 失败: {error_msg}")
-            return {
-                "success": False,
-                "message": f"换取 Token 失败: {error_msg}"
-            }
-        except Exception as e:
-            logger.error(f"换取 Token 失败: {str(e)}")
-            return {
-                "success": False,
-                "message": f"换取 Token 失败: {str(e)}"
-            }
-    
-    def _exchange_pin_for_token(self, pin_code: str) -> Optional[str]:
-        """内部方法：使用 PIN 码换取 Access Token，返回 token 或 None"""
-        try:
-            import json
-            import urllib.request
-            import urllib.error
-            
-            if not self._trakt_client_id or not self._trakt_client_secret:
-                logger.error("缺少 Client ID 或 Client Secret")
-                return None
-            
-            # 构造请求
-            url = "https://api.trakt.tv/oauth/token"
-            data = {
-                "code": pin_code.strip(),
-                "client_id": self._trakt_client_id,
-                "client_secret": self._trakt_client_secret,
-                "redirect_uri": "urn:ietf:wg:oauth:2.0:oob",
-                "grant_type": "authorization_code"
-            }
-            
-            # 发送 POST 请求
-            req = urllib.request.Request(
-                url,
-                data=json.dumps(data).encode('utf-8'),
-                headers={'Content-Type': 'application/json'}
-            )
-            
-            with urllib.request.urlopen(req, timeout=10) as response:
-                result = json.loads(response.read().decode('utf-8'))
-            
-            access_token = result.get('access_token')
-            return access_token if access_token else None
-            
-        except urllib.error.HTTPError as e:
-            error_msg = e.read().decode('utf-8') if hasattr(e, 'read') else str(e)
-            logger.error(f"HTTP 错误: {error_msg}")
-            
-            # 解析错误信息
-            if 'invalid_grant' in error_msg:
-                logger.error("")
-                logger.error("PIN 码无效或已过期！")
-                logger.error("")
-                logger.error("常见原因:")
-                logger.error("1. PIN 码已被使用过（每个 PIN 码只能使用一次）")
-                logger.error("2. PIN 码已过期（通常 10 分钟内有效）")
-                logger.error("3. Client ID/Secret 不正确")
-                logger.error("")
-                logger.error("解决方法:")
-                logger.error("1. 访问新的授权 URL 获取新 PIN 码:")
-                logger.error(f"   https://trakt.tv/oauth/authorize?response_type=code&client_id={self._trakt_client_id}&redirect_uri=urn:ietf:wg:oauth:2.0:oob")
-                logger.error("2. 在授权页面点击「Authorize」")
-                logger.error("3. 复制新的 PIN 码（注意不要有空格）")
-                logger.error("4. 粘贴到插件配置并立即保存")
-                logger.error("")
-            
-            return None
-        except Exception as e:
-            logger.error(f"换取 Token 失败: {str(e)}")
-            return None
 
-    def get_form(self) -> Tuple[List[dict], Dict[str, Any]]:
-        """
-        拼装插件配置页面，需要返回两块数据：1、页面配置；2、数据结构
-        """
-        return [
+def _create_session() -> requests.Session:
+    """
+    创建带连接池和重试的 HTTP 会话，复用 TLS 连接
+    不使用 HTTP 缓存：Trakt 数据按账号区分，由 ETag 和最后活动时间的本地缓存负责复用
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=8,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=[429, 500, 502, 503, 504]
+        )
+    )
+    session.mount("https://", adapter)
+    return session
+
+
+class _PlexPoolAdapter(HTTPAdapter):
+    """
+    挂载到 PlexServer 会话上的连接池适配器，用类型标记是否已挂载过
+    """
+
+
+def _tune_plex_session(plex) -> None:
+    """
+    扩大 PlexServer 会话到本服务器的连接池：多个媒体库并行同步和并发标记时，
+    requests 默认每个主机只保留 10 个连接，超出的用完即丢弃，后续请求要重新建立连接
+    只挂载到该服务器地址，不影响同一会话访问 plex.tv 等其他主机；
+    会话属于 MoviePilot，只扩大连接池，不改变重试等其他行为，且每个会话只挂载一次
+    """
+    session = getattr(plex, '_session', None)
+    baseurl = getattr(plex, '_baseurl', None)
+    if session is None or not baseurl:
+        return
+    prefix = baseurl.rstrip('/') + '/'
+    if isinstance(session.adapters.get(prefix), _PlexPoolAdapter):
+        return
+    session.mount(prefix, _PlexPoolAdapter(pool_connections=1, pool_maxsize=32))
+
+
+# 插件配置页面（静态结构，导入时构建一次）
+_FORM_SCHEMA = [
+    {
+        "component": "VForm",
+        "content": [
             {
-                "component": "VForm",
+                "component": "VRow",
                 "content": [
-                    {
-                        "component": "VRow",
-                        "content": [
                     {
                         "component": "VCol",
                         "props": {"cols": 12, "md": 4},
@@ -826,491 +807,996 @@ class PlexTraktSync(_PluginBase):
                     }
                 ]
             }
-                ]
-            }
-        ], {
-            "enabled": False,
-            "onlyonce": False,
-            "cron": "0 2 * * *",
-            "notify": False,
-            "plex_url": "",
-            "plex_token": "",
-            "plex_libraries": "",
-            "trakt_client_id": "",
-            "trakt_client_secret": "",
-            "trakt_username": "",
-            "trakt_pin_code": "",
-            "trakt_access_token": "",
-            "sync_movies": True,
-            "sync_shows": True,
-            "sync_watched": True,
-            "sync_ratings": True,
-            "sync_collection": True,
-            "sync_watchlist": False,
-            "two_way_sync": False,
-            "sync_from_trakt": False,
-            "skip_already_synced": True,
-            "batch_size": 100
-        }
-
-    def get_page(self) -> List[dict]:
-        """
-        插件数据页面，显示同步统计和状态
-        """
-        # 获取最后一次同步统计
-        last_stats = self._last_sync_stats if hasattr(self, '_last_sync_stats') and self._last_sync_stats else {}
-        last_sync_time = self._last_sync_time if hasattr(self, '_last_sync_time') and self._last_sync_time else "从未同步"
-        
-        # 获取配置状态（从 MediaServerHelper 读取 Plex）
-        try:
-            from app.helper.mediaserver import MediaServerHelper
-            mediaserver_helper = MediaServerHelper()
-            services = mediaserver_helper.get_services(type_filter="plex")
-            if services:
-                plex_service = list(services.values())[0]
-                if plex_service.instance and not plex_service.instance.is_inactive():
-                    plex_configured = True
-                    plex_host = plex_service.name
-                else:
-                    plex_configured = False
-                    plex_host = "未连接"
-            else:
-                plex_configured = False
-                plex_host = "未配置"
-        except Exception as e:
-            logger.error(f"获取 Plex 配置失败: {str(e)}")
-            plex_configured = False
-            plex_host = "获取失败"
-        trakt_configured = bool(self._trakt_client_id and self._trakt_client_secret and self._trakt_access_token)
-        
-        # 构建数据页面
-        return [
-            {
-                "component": "VRow",
-                "content": [
-                    # 配置状态卡片
-                    {
-                        "component": "VCol",
-                        "props": {
-                            "cols": 12,
-                            "md": 6
-                        },
-                        "content": [
-                            {
-                                "component": "VCard",
-                                "props": {
-                                    "variant": "tonal"
+        ]
+    }
+]
+
+# 插件配置默认值
+_FORM_DEFAULTS = {
+    "enabled": False,
+    "onlyonce": False,
+    "cron": "0 2 * * *",
+    "notify": False,
+    "plex_url": "",
+    "plex_token": "",
+    "plex_libraries": "",
+    "trakt_client_id": "",
+    "trakt_client_secret": "",
+    "trakt_username": "",
+    "trakt_pin_code": "",
+    "trakt_access_token": "",
+    "sync_movies": True,
+    "sync_shows": True,
+    "sync_watched": True,
+    "sync_ratings": True,
+    "sync_collection": True,
+    "sync_watchlist": False,
+    "two_way_sync": False,
+    "sync_from_trakt": False,
+    "skip_already_synced": True,
+    "batch_size": 100
+}
+
+
+def _build_page_template() -> List[dict]:
+    """
+    构建数据页面骨架，动态字段用 "$名称" 占位
+    """
+    return [
+        {
+            "component": "VRow",
+            "content": [
+                # 配置状态卡片
+                {
+                    "component": "VCol",
+                    "props": {
+                        "cols": 12,
+                        "md": 6
+                    },
+                    "content": [
+                        {
+                            "component": "VCard",
+                            "props": {
+                                "variant": "tonal"
+                            },
+                            "content": [
+                                {
+                                    "component": "VCardTitle",
+                                    "text": "配置状态"
                                 },
-                                "content": [
-                                    {
-                                        "component": "VCardTitle",
-                                        "text": "配置状态"
-                                    },
-                                    {
-                                        "component": "VCardText",
-                                        "content": [
-                                            {
-                                                "component": "VList",
-                                                "props": {
-                                                    "density": "compact"
-                                                },
-                                                "content": [
-                                                    {
-                                                        "component": "VListItem",
-                                                        "props": {
-                                                            "title": "Plex 连接",
-                                                            "subtitle": f"已配置 ({plex_host})" if plex_configured else "未配置（请在系统设置中配置）"
-                                                        },
-                                                        "content": [
-                                                            {
-                                                                "component": "template",
-                                                                "props": {
-                                                                    "v-slot:prepend": ""
-                                                                },
-                                                                "content": [
-                                                                    {
-                                                                        "component": "VIcon",
-                                                                        "props": {
-                                                                            "icon": "mdi-check-circle" if plex_configured else "mdi-alert-circle",
-                                                                            "color": "success" if plex_configured else "error"
-                                                                        }
-                                                                    }
-                                                                ]
-                                                            }
-                                                        ]
+                                {
+                                    "component": "VCardText",
+                                    "content": [
+                                        {
+                                            "component": "VList",
+                                            "props": {
+                                                "density": "compact"
+                                            },
+                                            "content": [
+                                                {
+                                                    "component": "VListItem",
+                                                    "props": {
+                                                        "title": "Plex 连接",
+                                                        "subtitle": "$plex_subtitle"
                                                     },
-                                                    {
-                                                        "component": "VListItem",
-                                                        "props": {
-                                                            "title": "Trakt 认证",
-                                                            "subtitle": "已认证" if trakt_configured else "未认证"
-                                                        },
-                                                        "content": [
-                                                            {
-                                                                "component": "template",
-                                                                "props": {
-                                                                    "v-slot:prepend": ""
-                                                                },
-                                                                "content": [
-                                                                    {
-                                                                        "component": "VIcon",
-                                                                        "props": {
-                                                                            "icon": "mdi-check-circle" if trakt_configured else "mdi-alert-circle",
-                                                                            "color": "success" if trakt_configured else "error"
-                                                                        }
+                                                    "content": [
+                                                        {
+                                                            "component": "template",
+                                                            "props": {
+                                                                "v-slot:prepend": ""
+                                                            },
+                                                            "content": [
+                                                                {
+                                                                    "component": "VIcon",
+                                                                    "props": {
+                                                                        "icon": "$plex_icon",
+                                                                        "color": "$plex_color"
                                                                     }
-                                                                ]
-                                                            }
-                                                        ]
-                                                    }
-                                                ]
-                                            }
-                                        ]
-                                    }
-                                ]
-                            }
-                        ]
+                                                                }
+                                                            ]
+                                                        }
+                                                    ]
+                                                },
+                                                {
+                                                    "component": "VListItem",
+                                                    "props": {
+                                                        "title": "Trakt 认证",
+                                                        "subtitle": "$trakt_subtitle"
+                                                    },
+                                                    "content": [
+                                                        {
+                                                            "component": "template",
+                                                            "props": {
+                                                                "v-slot:prepend": ""
+                                                            },
+                                                            "content": [
+                                                                {
+                                                                    "component": "VIcon",
+                                                                    "props": {
+                                                                        "icon": "$trakt_icon",
+                                                                        "color": "$trakt_color"
+                                                                    }
+                                                                }
+                                                            ]
+                                                        }
+                                                    ]
+                                                }
+                                            ]
+                                        }
+                                    ]
+                                }
+                            ]
+                        }
+                    ]
+                },
+                # 最后同步时间卡片
+                {
+                    "component": "VCol",
+                    "props": {
+                        "cols": 12,
+                        "md": 6
                     },
-                    # 最后同步时间卡片
-                    {
-                        "component": "VCol",
-                        "props": {
-                            "cols": 12,
-                            "md": 6
-                        },
-                        "content": [
-                            {
-                                "component": "VCard",
-                                "props": {
-                                    "variant": "tonal"
+                    "content": [
+                        {
+                            "component": "VCard",
+                            "props": {
+                                "variant": "tonal"
+                            },
+                            "content": [
+                                {
+                                    "component": "VCardTitle",
+                                    "text": "同步状态"
                                 },
-                                "content": [
-                                    {
-                                        "component": "VCardTitle",
-                                        "text": "同步状态"
-                                    },
-                                    {
-                                        "component": "VCardText",
-                                        "content": [
-                                            {
-                                                "component": "VList",
-                                                "props": {
-                                                    "density": "compact"
-                                                },
-                                                "content": [
-                                                    {
-                                                        "component": "VListItem",
-                                                        "props": {
-                                                            "title": "最后同步",
-                                                            "subtitle": last_sync_time
-                                                        },
-                                                        "content": [
-                                                            {
-                                                                "component": "template",
-                                                                "props": {
-                                                                    "v-slot:prepend": ""
-                                                                },
-                                                                "content": [
-                                                                    {
-                                                                        "component": "VIcon",
-                                                                        "props": {
-                                                                            "icon": "mdi-clock-outline"
-                                                                        }
+                                {
+                                    "component": "VCardText",
+                                    "content": [
+                                        {
+                                            "component": "VList",
+                                            "props": {
+                                                "density": "compact"
+                                            },
+                                            "content": [
+                                                {
+                                                    "component": "VListItem",
+                                                    "props": {
+                                                        "title": "最后同步",
+                                                        "subtitle": "$last_sync_time"
+                                                    },
+                                                    "content": [
+                                                        {
+                                                            "component": "template",
+                                                            "props": {
+                                                                "v-slot:prepend": ""
+                                                            },
+                                                            "content": [
+                                                                {
+                                                                    "component": "VIcon",
+                                                                    "props": {
+                                                                        "icon": "mdi-clock-outline"
                                                                     }
-                                                                ]
-                                                            }
-                                                        ]
+                                                                }
+                                                            ]
+                                                        }
+                                                    ]
+                                                },
+                                                {
+                                                    "component": "VListItem",
+                                                    "props": {
+                                                        "title": "同步状态",
+                                                        "subtitle": "$sync_subtitle"
                                                     },
-                                                    {
-                                                        "component": "VListItem",
-                                                        "props": {
-                                                            "title": "同步状态",
-                                                            "subtitle": "已启用" if self._enabled else "已禁用"
-                                                        },
-                                                        "content": [
-                                                            {
-                                                                "component": "template",
-                                                                "props": {
-                                                                    "v-slot:prepend": ""
-                                                                },
-                                                                "content": [
-                                                                    {
-                                                                        "component": "VIcon",
-                                                                        "props": {
-                                                                            "icon": "mdi-sync" if self._enabled else "mdi-sync-off",
-                                                                            "color": "success" if self._enabled else "grey"
-                                                                        }
+                                                    "content": [
+                                                        {
+                                                            "component": "template",
+                                                            "props": {
+                                                                "v-slot:prepend": ""
+                                                            },
+                                                            "content": [
+                                                                {
+                                                                    "component": "VIcon",
+                                                                    "props": {
+                                                                        "icon": "$sync_icon",
+                                                                        "color": "$sync_color"
                                                                     }
-                                                                ]
-                                                            }
-                                                        ]
-                                                    }
-                                                ]
-                                            }
-                                        ]
-                                    }
-                                ]
-                            }
-                        ]
-                    }
-                ]
-            },
-            # 同步统计卡片
-            {
-                "component": "VRow",
-                "content": [
-                    {
-                        "component": "VCol",
-                        "props": {
-                            "cols": 12
-                        },
-                        "content": [
-                            {
-                                "component": "VCard",
-                                "props": {
-                                    "variant": "tonal"
+                                                                }
+                                                            ]
+                                                        }
+                                                    ]
+                                                }
+                                            ]
+                                        }
+                                    ]
+                                }
+                            ]
+                        }
+                    ]
+                }
+            ]
+        },
+        # 同步统计卡片
+        {
+            "component": "VRow",
+            "content": [
+                {
+                    "component": "VCol",
+                    "props": {
+                        "cols": 12
+                    },
+                    "content": [
+                        {
+                            "component": "VCard",
+                            "props": {
+                                "variant": "tonal"
+                            },
+                            "content": [
+                                {
+                                    "component": "VCardTitle",
+                                    "text": "同步统计"
                                 },
-                                "content": [
-                                    {
-                                        "component": "VCardTitle",
-                                        "text": "同步统计"
-                                    },
-                                    {
-                                        "component": "VCardText",
-                                        "content": [
-                                            {
-                                                "component": "VRow",
-                                                "content": [
-                                                    {
-                                                        "component": "VCol",
-                                                        "props": {
-                                                            "cols": 6,
-                                                            "md": 3
-                                                        },
-                                                        "content": [
-                                                            {
-                                                                "component": "div",
-                                                                "props": {
-                                                                    "class": "text-center"
+                                {
+                                    "component": "VCardText",
+                                    "content": [
+                                        {
+                                            "component": "VRow",
+                                            "content": [
+                                                {
+                                                    "component": "VCol",
+                                                    "props": {
+                                                        "cols": 6,
+                                                        "md": 3
+                                                    },
+                                                    "content": [
+                                                        {
+                                                            "component": "div",
+                                                            "props": {
+                                                                "class": "text-center"
+                                                            },
+                                                            "content": [
+                                                                {
+                                                                    "component": "div",
+                                                                    "props": {
+                                                                        "class": "text-h4"
+                                                                    },
+                                                                    "text": "$movies_synced"
                                                                 },
-                                                                "content": [
-                                                                    {
-                                                                        "component": "div",
-                                                                        "props": {
-                                                                            "class": "text-h4"
-                                                                        },
-                                                                        "text": str(last_stats.get('movies_synced', 0))
+                                                                {
+                                                                    "component": "div",
+                                                                    "props": {
+                                                                        "class": "text-caption text-grey"
                                                                     },
-                                                                    {
-                                                                        "component": "div",
-                                                                        "props": {
-                                                                            "class": "text-caption text-grey"
-                                                                        },
-                                                                        "text": "电影已同步"
-                                                                    }
-                                                                ]
-                                                            }
-                                                        ]
+                                                                    "text": "电影已同步"
+                                                                }
+                                                            ]
+                                                        }
+                                                    ]
+                                                },
+                                                {
+                                                    "component": "VCol",
+                                                    "props": {
+                                                        "cols": 6,
+                                                        "md": 3
                                                     },
-                                                    {
-                                                        "component": "VCol",
-                                                        "props": {
-                                                            "cols": 6,
-                                                            "md": 3
-                                                        },
-                                                        "content": [
-                                                            {
-                                                                "component": "div",
-                                                                "props": {
-                                                                    "class": "text-center"
+                                                    "content": [
+                                                        {
+                                                            "component": "div",
+                                                            "props": {
+                                                                "class": "text-center"
+                                                            },
+                                                            "content": [
+                                                                {
+                                                                    "component": "div",
+                                                                    "props": {
+                                                                        "class": "text-h4"
+                                                                    },
+                                                                    "text": "$shows_synced"
                                                                 },
-                                                                "content": [
-                                                                    {
-                                                                        "component": "div",
-                                                                        "props": {
-                                                                            "class": "text-h4"
-                                                                        },
-                                                                        "text": str(last_stats.get('shows_synced', 0))
+                                                                {
+                                                                    "component": "div",
+                                                                    "props": {
+                                                                        "class": "text-caption text-grey"
                                                                     },
-                                                                    {
-                                                                        "component": "div",
-                                                                        "props": {
-                                                                            "class": "text-caption text-grey"
-                                                                        },
-                                                                        "text": "剧集已同步"
-                                                                    }
-                                                                ]
-                                                            }
-                                                        ]
+                                                                    "text": "剧集已同步"
+                                                                }
+                                                            ]
+                                                        }
+                                                    ]
+                                                },
+                                                {
+                                                    "component": "VCol",
+                                                    "props": {
+                                                        "cols": 6,
+                                                        "md": 3
                                                     },
-                                                    {
-                                                        "component": "VCol",
-                                                        "props": {
-                                                            "cols": 6,
-                                                            "md": 3
-                                                        },
-                                                        "content": [
-                                                            {
-                                                                "component": "div",
-                                                                "props": {
-                                                                    "class": "text-center"
+                                                    "content": [
+                                                        {
+                                                            "component": "div",
+                                                            "props": {
+                                                                "class": "text-center"
+                                                            },
+                                                            "content": [
+                                                                {
+                                                                    "component": "div",
+                                                                    "props": {
+                                                                        "class": "text-h4"
+                                                                    },
+                                                                    "text": "$episodes_synced"
                                                                 },
-                                                                "content": [
-                                                                    {
-                                                                        "component": "div",
-                                                                        "props": {
-                                                                            "class": "text-h4"
-                                                                        },
-                                                                        "text": str(last_stats.get('episodes_synced', 0))
+                                                                {
+                                                                    "component": "div",
+                                                                    "props": {
+                                                                        "class": "text-caption text-grey"
                                                                     },
-                                                                    {
-                                                                        "component": "div",
-                                                                        "props": {
-                                                                            "class": "text-caption text-grey"
-                                                                        },
-                                                                        "text": "单集已同步"
-                                                                    }
-                                                                ]
-                                                            }
-                                                        ]
+                                                                    "text": "单集已同步"
+                                                                }
+                                                            ]
+                                                        }
+                                                    ]
+                                                },
+                                                {
+                                                    "component": "VCol",
+                                                    "props": {
+                                                        "cols": 6,
+                                                        "md": 3
                                                     },
-                                                    {
-                                                        "component": "VCol",
-                                                        "props": {
-                                                            "cols": 6,
-                                                            "md": 3
-                                                        },
-                                                        "content": [
-                                                            {
-                                                                "component": "div",
-                                                                "props": {
-                                                                    "class": "text-center"
+                                                    "content": [
+                                                        {
+                                                            "component": "div",
+                                                            "props": {
+                                                                "class": "text-center"
+                                                            },
+                                                            "content": [
+                                                                {
+                                                                    "component": "div",
+                                                                    "props": {
+                                                                        "class": "text-h4"
+                                                                    },
+                                                                    "text": "$ratings_synced"
                                                                 },
-                                                                "content": [
-                                                                    {
-                                                                        "component": "div",
-                                                                        "props": {
-                                                                            "class": "text-h4"
-                                                                        },
-                                                                        "text": str(last_stats.get('ratings_synced', 0))
+                                                                {
+                                                                    "component": "div",
+                                                                    "props": {
+                                                                        "class": "text-caption text-grey"
                                                                     },
-                                                                    {
-                                                                        "component": "div",
-                                                                        "props": {
-                                                                            "class": "text-caption text-grey"
-                                                                        },
-                                                                        "text": "评分已同步"
-                                                                    }
-                                                                ]
-                                                            }
-                                                        ]
-                                                    }
-                                                ]
-                                            },
-                                            {
-                                                "component": "VDivider",
-                                                "props": {
-                                                    "class": "my-4"
+                                                                    "text": "评分已同步"
+                                                                }
+                                                            ]
+                                                        }
+                                                    ]
                                                 }
-                                            },
-                                            {
-                                                "component": "VRow",
-                                                "content": [
-                                                    {
-                                                        "component": "VCol",
-                                                        "props": {
-                                                            "cols": 6
-                                                        },
-                                                        "content": [
-                                                            {
-                                                                "component": "div",
-                                                                "props": {
-                                                                    "class": "text-center"
+                                            ]
+                                        },
+                                        {
+                                            "component": "VDivider",
+                                            "props": {
+                                                "class": "my-4"
+                                            }
+                                        },
+                                        {
+                                            "component": "VRow",
+                                            "content": [
+                                                {
+                                                    "component": "VCol",
+                                                    "props": {
+                                                        "cols": 6
+                                                    },
+                                                    "content": [
+                                                        {
+                                                            "component": "div",
+                                                            "props": {
+                                                                "class": "text-center"
+                                                            },
+                                                            "content": [
+                                                                {
+                                                                    "component": "div",
+                                                                    "props": {
+                                                                        "class": "text-h5"
+                                                                    },
+                                                                    "text": "$watched_synced"
                                                                 },
-                                                                "content": [
-                                                                    {
-                                                                        "component": "div",
-                                                                        "props": {
-                                                                            "class": "text-h5"
-                                                                        },
-                                                                        "text": str(last_stats.get('watched_synced', 0))
+                                                                {
+                                                                    "component": "div",
+                                                                    "props": {
+                                                                        "class": "text-caption text-grey"
                                                                     },
-                                                                    {
-                                                                        "component": "div",
-                                                                        "props": {
-                                                                            "class": "text-caption text-grey"
-                                                                        },
-                                                                        "text": "观看记录已同步"
-                                                                    }
-                                                                ]
-                                                            }
-                                                        ]
+                                                                    "text": "观看记录已同步"
+                                                                }
+                                                            ]
+                                                        }
+                                                    ]
+                                                },
+                                                {
+                                                    "component": "VCol",
+                                                    "props": {
+                                                        "cols": 6
                                                     },
-                                                    {
-                                                        "component": "VCol",
-                                                        "props": {
-                                                            "cols": 6
-                                                        },
-                                                        "content": [
-                                                            {
-                                                                "component": "div",
-                                                                "props": {
-                                                                    "class": "text-center"
+                                                    "content": [
+                                                        {
+                                                            "component": "div",
+                                                            "props": {
+                                                                "class": "text-center"
+                                                            },
+                                                            "content": [
+                                                                {
+                                                                    "component": "div",
+                                                                    "props": {
+                                                                        "class": "$errors_class"
+                                                                    },
+                                                                    "text": "$errors"
                                                                 },
-                                                                "content": [
-                                                                    {
-                                                                        "component": "div",
-                                                                        "props": {
-                                                                            "class": "text-h5 text-error" if last_stats.get('errors', 0) > 0 else "text-h5"
-                                                                        },
-                                                                        "text": str(last_stats.get('errors', 0))
+                                                                {
+                                                                    "component": "div",
+                                                                    "props": {
+                                                                        "class": "text-caption text-grey"
                                                                     },
-                                                                    {
-                                                                        "component": "div",
-                                                                        "props": {
-                                                                            "class": "text-caption text-grey"
-                                                                        },
-                                                                        "text": "错误数量"
-                                                                    }
-                                                                ]
-                                                            }
-                                                        ]
-                                                    }
-                                                ]
-                                            }
-                                        ]
-                                    }
-                                ]
-                            }
-                        ]
+                                                                    "text": "错误数量"
+                                                                }
+                                                            ]
+                                                        }
+                                                    ]
+                                                }
+                                            ]
+                                        }
+                                    ]
+                                }
+                            ]
+                        }
+                    ]
+                }
+            ]
+        }
+    ]
+
+
+def _collect_page_slots(node: Any, path: tuple = ()) -> List[Tuple[tuple, Any, str]]:
+    """
+    记录模板中所有占位符的位置：(父节点路径, 键或下标, 占位符名称)
+    """
+    slots = []
+    items = node.items() if isinstance(node, dict) else enumerate(node)
+    for key, value in items:
+        if isinstance(value, str):
+            if value.startswith("$"):
+                slots.append((path, key, value[1:]))
+        elif isinstance(value, (dict, list, tuple)):
+            slots.extend(_collect_page_slots(value, path + (key,)))
+    return slots
+
+
+def _freeze_lists(node: Any) -> Any:
+    """
+    将模板中的列表递归转换为元组，静态部分共享时不会被意外修改
+    """
+    if isinstance(node, dict):
+        return {key: _freeze_lists(value) for key, value in node.items()}
+    if isinstance(node, list):
+        return tuple(_freeze_lists(value) for value in node)
+    return node
+
+
+# 数据页面骨架及占位符位置（导入时构建一次）
+_PAGE_TEMPLATE = _freeze_lists(_build_page_template())
+_PAGE_SLOTS = _collect_page_slots(_PAGE_TEMPLATE)
+
+
+def _render_page(values: Dict[str, str]) -> List[dict]:
+    """
+    填充数据页面：只复制通往动态字段的节点，其余静态子树直接共享
+    需要写入的元组复制为列表，其余保持元组（序列化结果与列表相同）
+    """
+    root = list(_PAGE_TEMPLATE)
+    copied = {(): root}
+    for path, key, name in _PAGE_SLOTS:
+        node = root
+        for depth, step in enumerate(path):
+            sub_path = path[:depth + 1]
+            child = copied.get(sub_path)
+            if child is None:
+                child = node[step]
+                child = list(child) if isinstance(child, tuple) else copy.copy(child)
+                node[step] = child
+                copied[sub_path] = child
+            node = child
+        node[key] = values[name]
+    return root
+
+
+@lru_cache(maxsize=32)
+def _plex_status_bits(configured: bool, host: str) -> Tuple[str, str, str]:
+    """
+    Plex 状态行的 (副标题, 图标, 颜色)
+    """
+    if configured:
+        return f"已配置 ({host})", "mdi-check-circle", "success"
+    return "未配置（请在系统设置中配置）", "mdi-alert-circle", "error"
+
+
+# Trakt 认证 / 同步开关状态行的 (副标题, 图标, 颜色)
+_TRAKT_STATUS_BITS = {
+    True: ("已认证", "mdi-check-circle", "success"),
+    False: ("未认证", "mdi-alert-circle", "error")
+}
+_SYNC_STATUS_BITS = {
+    True: ("已启用", "mdi-sync", "success"),
+    False: ("已禁用", "mdi-sync-off", "grey")
+}
+
+
+class PlexTraktSync(_PluginBase):
+    # 插件名称
+    plugin_name = "Plex Trakt 同步"
+    # 插件描述
+    plugin_desc = "同步 Plex 观看记录到 Trakt"
+    # 插件图标
+    plugin_icon = "https://raw.githubusercontent.com/jxxghp/MoviePilot-Plugins/main/icons/trakt.png"
+    # 插件版本
+    plugin_version = "2.4.0"
+    # 插件作者
+    plugin_author = "PlexTraktSync"
+    # 作者主页
+    author_url = "https://github.com/Taxel/PlexTraktSync"
+    # 插件配置项ID前缀
+    plugin_config_prefix = "plextraktsync_"
+    # 加载顺序
+    plugin_order = 15
+    # 可使用的用户级别
+    auth_level = 2
+    # 启用数据页面
+    plugin_page = True
+
+    # 私有属性
+    _enabled = False
+    _onlyonce = False
+    _cron = None
+    _notify = False
+
+    # Plex 配置将从 MoviePilot 系统配置中获取
+    _plex_libraries = None
+
+    # Trakt 配置
+    _trakt_client_id = None
+    _trakt_client_secret = None
+    _trakt_username = None
+    _trakt_access_token = None  # OAuth Access Token
+    _trakt_pin_code = None  # 用户输入的 PIN 码，用于换取 Token
+    _trakt_client_id_quoted = None  # URL 编码后的 Client ID，配置加载时计算一次
+    _trakt_auth_url = None  # 授权链接，配置加载时生成
+    _trakt_configured = False  # Client ID/Secret 与 Access Token 是否齐全
+
+    # 同步选项
+    _sync_movies = True
+    _sync_shows = True
+    _sync_watched = True
+    _sync_ratings = True
+    _sync_collection = True
+    _sync_watchlist = False
+
+    # 高级选项
+    _two_way_sync = False
+    _sync_from_trakt = False
+    _skip_already_synced = True
+    _batch_size = 100
+
+    # 最后一次同步结果（供数据页面显示，同步完成后整体替换）
+    _last_sync_stats: Dict[str, int] = {}
+    _last_sync_time = "从未同步"
+
+    # 定时器
+    _scheduler: Optional["BackgroundScheduler"] = None
+    _event = ThreadEvent()
+    # 已解析的 Cron 触发器，按表达式缓存，重载配置时复用
+    _cron_trigger_cache: ClassVar[Dict[str, "CronTrigger"]] = {}
+
+    # Plex 连接状态缓存：(时间戳, 是否已连接, 显示名称)
+    _plex_status_cache: Optional[Tuple[float, bool, str]] = None
+    _plex_status_ttl = 30
+    # 本次同步开始时获取的 Trakt sync/last_activities
+    _trakt_activities: Dict[str, Any] = {}
+    # 配置的 Trakt 用户不是 Token 所属用户时，从该用户读取观看记录和评分
+    _trakt_read_user: Optional[str] = None
+    # 已验证的 Plex 服务器：(时间戳, Plex 模块, PlexServer, 服务名称)，同步时复用
+    _cached_plex: Optional[Tuple[float, Any, Any, str]] = None
+    _cached_plex_ttl = 300
+
+    # 共享 HTTP 会话（连接池）
+    _session: ClassVar[requests.Session] = _create_session()
+
+    # Plex 条目的外部 ID：(ratingKey, guid) -> {'imdb': ..., 'tmdb': ...}，跨同步复用
+    # 按最近使用淘汰，最多保留 _external_ids_cache_size 条；多个媒体库并行同步时由锁保护
+    _external_ids_cache: ClassVar["OrderedDict[Tuple[int, str], Dict[str, str]]"] = OrderedDict()
+    _external_ids_cache_size: ClassVar[int] = 20000
+    _external_ids_lock: ClassVar[Lock] = Lock()
+
+    # 最近一次验证通过的 Token：(Token, 验证时间, 当前用户信息)
+    _verified_token: ClassVar[Optional[Tuple[str, float, Dict[str, Any]]]] = None
+
+    # pytrakt 依赖是否已验证通过（进程内有效，只有重装后才会变化）
+    _deps_verified: ClassVar[bool] = False
+
+    # 同步任务运行锁，非阻塞获取，防止两次同步重叠
+    _sync_running: ClassVar[Lock] = Lock()
+
+    def init_plugin(self, config: dict = None):
+        """
+        初始化插件
+        """
+        # 停止现有任务
+        self.stop_service()
+        # 配置变更后重新获取 Plex 状态
+        self._plex_status_cache = None
+        self._cached_plex = None
+
+        if config:
+            # 配置是否需要回写，所有修改合并为一次 update_config
+            config_dirty = False
+            # 与配置页面共用同一份默认值
+            cfg = {**_FORM_DEFAULTS, **config}
+
+            self._enabled = cfg["enabled"]
+            self._onlyonce = cfg["onlyonce"]
+            self._cron = cfg["cron"]
+            self._notify = cfg["notify"]
+
+            # Plex 配置从系统设置获取
+            self._plex_libraries = cfg["plex_libraries"]
+
+            # Trakt 配置
+            self._trakt_client_id = cfg["trakt_client_id"]
+            self._trakt_client_secret = cfg["trakt_client_secret"]
+            self._trakt_username = cfg["trakt_username"]
+            self._trakt_access_token = cfg["trakt_access_token"]
+            self._trakt_pin_code = cfg["trakt_pin_code"]
+            self._trakt_client_id_quoted = quote(self._trakt_client_id or '', safe='')
+            self._trakt_auth_url = (
+                f"{TRAKT_AUTHORIZE_URL}?response_type=code"
+                f"&client_id={self._trakt_client_id_quoted}&redirect_uri={TRAKT_REDIRECT_URI}"
+            )
+            
+            # 如果有 PIN 码但没有 Token，尝试换取 Token
+            if self._trakt_pin_code and not self._trakt_access_token:
+                logger.info("检测到 PIN 码，尝试换取 Access Token...")
+                token = self._exchange_pin_for_token(self._trakt_pin_code)
+                if token:
+                    self._trakt_access_token = token
+                    # 保存 Token 到配置并清空 PIN 码
+                    config['trakt_access_token'] = token
+                    config['trakt_pin_code'] = ""  # 清空 PIN 码
+                    config_dirty = True
+                    logger.info("✓ 成功换取 Access Token")
+                else:
+                    logger.error("✗ PIN 码换取 Token 失败")
+            self._trakt_configured = bool(
+                self._trakt_client_id and self._trakt_client_secret and self._trakt_access_token
+            )
+
+            # 同步选项
+            self._sync_movies = cfg["sync_movies"]
+            self._sync_shows = cfg["sync_shows"]
+            self._sync_watched = cfg["sync_watched"]
+            self._sync_ratings = cfg["sync_ratings"]
+            self._sync_collection = cfg["sync_collection"]
+            self._sync_watchlist = cfg["sync_watchlist"]
+
+            # 高级选项
+            self._two_way_sync = cfg["two_way_sync"]
+            self._sync_from_trakt = cfg["sync_from_trakt"]
+            self._skip_already_synced = cfg["skip_already_synced"]
+            # 配置页面的数字输入可能是字符串，无效值回退到默认值
+            try:
+                batch_size = int(cfg["batch_size"])
+            except (TypeError, ValueError):
+                batch_size = _FORM_DEFAULTS["batch_size"]
+            self._batch_size = max(1, min(batch_size, TRAKT_MAX_BATCH_SIZE))
+
+            # 启动定时任务
+            if self._enabled or self._onlyonce:
+                # 调度器仅在启用时导入，禁用的插件不加载 apscheduler
+                from apscheduler.executors.pool import ThreadPoolExecutor as APSThreadPoolExecutor
+                from apscheduler.schedulers.background import BackgroundScheduler
+                from apscheduler.triggers.cron import CronTrigger
+                import pytz
+
+                # 单线程执行器 + 合并错过的触发，避免同步任务并发或堆积
+                self._scheduler = BackgroundScheduler(
+                    timezone=settings.TZ,
+                    executors={'default': APSThreadPoolExecutor(1)},
+                    job_defaults={
+                        'coalesce': True,
+                        'max_instances': 1,
+                        'misfire_grace_time': 3600
                     }
-                ]
+                )
+                jobs_added = False
+
+                if self._onlyonce:
+                    logger.info("Plex Trakt 同步服务，立即运行一次")
+                    # 手动运行时不使用缓存的验证结果，重新检查依赖包
+                    self._scheduler.add_job(
+                        func=self.__sync_task,
+                        trigger='date',
+                        run_date=datetime.now(tz=pytz.timezone(settings.TZ)),
+                        kwargs={'force_verify': True},
+                        name="Plex Trakt 同步"
+                    )
+                    jobs_added = True
+                    # 关闭一次性开关
+                    self._onlyonce = False
+                    config['onlyonce'] = False
+                    config_dirty = True
+
+                if self._enabled and self._cron:
+                    try:
+                        trigger = self._cron_trigger_cache.get(self._cron)
+                        if trigger is None:
+                            trigger = CronTrigger.from_crontab(self._cron)
+                            self._cron_trigger_cache[self._cron] = trigger
+                        self._scheduler.add_job(
+                            func=self.__sync_task,
+                            trigger=trigger,
+                            name="Plex Trakt 同步"
+                        )
+                        jobs_added = True
+                        logger.info(f"Plex Trakt 同步定时任务已启动，执行周期：{self._cron}")
+                    except Exception as e:
+                        logger.error(f"定时任务配置错误：{str(e)}")
+
+                if jobs_added:
+                    self._scheduler.start()
+
+            if config_dirty:
+                self.update_config(config)
+
+    def get_state(self) -> bool:
+        """
+        获取插件状态
+        """
+        return self._enabled
+
+    @staticmethod
+    def get_command() -> List[Dict[str, Any]]:
+        """
+        定义远程控制命令
+        """
+        pass
+
+    def get_api(self) -> List[Dict[str, Any]]:
+        """
+        获取插件API
+        """
+        return [
+            {
+                "path": "/get_auth_url",
+                "endpoint": self.get_auth_url,
+                "methods": ["GET"],
+                "summary": "获取 Trakt 授权 URL",
+                "description": "生成 Trakt OAuth 授权链接"
+            },
+            {
+                "path": "/exchange_pin",
+                "endpoint": self.exchange_pin,
+                "methods": ["POST"],
+                "summary": "使用 PIN 码换取 Access Token",
+                "description": "将用户授权的 PIN 码换取 Access Token"
             }
         ]
+    
+    def get_auth_url(self) -> dict:
+        """生成 Trakt 授权 URL"""
+        if not self._trakt_client_id:
+            return {
+                "success": False,
+                "message": "请先配置 Trakt Client ID"
+            }
+        
+        return {
+            "success": True,
+            "auth_url": self._trakt_auth_url,
+            "message": "请在浏览器中打开此链接并授权"
+        }
+    
+    def _post_token(self, pin_code: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """
+        向 Trakt 提交 PIN 码换取 Token，返回 (access_token, refresh_token, 错误信息)
+        """
+        data = {
+            "code": pin_code.strip(),
+            "client_id": self._trakt_client_id,
+            "client_secret": self._trakt_client_secret,
+            "redirect_uri": TRAKT_REDIRECT_URI,
+            "grant_type": TRAKT_GRANT_TYPE
+        }
+        try:
+            response = self._session.post(
+                TRAKT_TOKEN_URL,
+                data=_json_dumps(data),
+                headers={'Content-Type': 'application/json'},
+                timeout=10
+            )
+            response.raise_for_status()
+            result = _json_loads(response.content)
+        except requests.HTTPError as e:
+            # raise_for_status 抛出的异常总是带有 response
+            return None, None, e.response.text
+        except (requests.RequestException, ValueError) as e:
+            # ValueError 覆盖响应体不是合法 JSON 的情况
+            return None, None, str(e)
+
+        access_token = result.get('access_token')
+        if not access_token:
+            return None, None, "未能获取 Access Token"
+        return access_token, result.get('refresh_token'), None
+
+    def exchange_pin(self, pin_code: str) -> dict:
+        """使用 PIN 码换取 Access Token"""
+        if not self._trakt_client_id or not self._trakt_client_secret:
+            return {
+                "success": False,
+                "message": "请先配置 Trakt Client ID 和 Client Secret"
+            }
+        
+        if not pin_code:
+            return {
+                "success": False,
+                "message": "PIN 码不能为空"
+            }
+        
+        access_token, refresh_token, error_msg = self._post_token(pin_code)
+        if not access_token:
+            logger.error("换取 Token 失败: %s", error_msg)
+            return {
+                "success": False,
+                "message": f"换取 Token 失败: {error_msg}"
+            }
+        
+        # 自动保存 Token 到配置
+        config = self.get_config()
+        config['trakt_access_token'] = access_token
+        self.update_config(config)
+        self._trakt_access_token = access_token
+        self._trakt_configured = True
+        
+        logger.info("✓ 成功获取并保存 Trakt Access Token")
+        
+        return {
+            "success": True,
+            "access_token": access_token,
+            "refresh_token": refresh_token,
+            "message": "✓ 成功获取 Access Token！已自动保存到配置中"
+        }
+    
+    def _exchange_pin_for_token(self, pin_code: str) -> Optional[str]:
+        """内部方法：使用 PIN 码换取 Access Token，返回 token 或 None"""
+        if not self._trakt_client_id or not self._trakt_client_secret:
+            logger.error("缺少 Client ID 或 Client Secret")
+            return None
+        
+        access_token, _, error_msg = self._post_token(pin_code)
+        if access_token:
+            return access_token
+        
+        logger.error("换取 Token 失败: %s", error_msg)
+        
+        # 解析错误信息
+        if 'invalid_grant' in error_msg:
+            logger.error(_INVALID_GRANT_HINT, self._trakt_auth_url)
+        
+        return None
+
+    def get_form(self) -> Tuple[List[dict], Dict[str, Any]]:
+        """
+        拼装插件配置页面，需要返回两块数据：1、页面配置；2、数据结构
+        """
+        # 默认值返回浅拷贝，避免调用方合并已保存配置时改写共享的默认值
+        return _FORM_SCHEMA, dict(_FORM_DEFAULTS)
+
+    def get_page(self) -> List[dict]:
+        """
+        插件数据页面，显示同步统计和状态
+        """
+        # 获取最后一次同步统计
+        last_stats = self._last_sync_stats
+        last_sync_time = self._last_sync_time
+        errors = last_stats.get('errors', 0)
+        
+        # 获取配置状态（从 MediaServerHelper 读取 Plex，短时间内复用结果）
+        plex_configured, plex_host = self._get_plex_status()
+        plex_subtitle, plex_icon, plex_color = _plex_status_bits(plex_configured, plex_host)
+        trakt_subtitle, trakt_icon, trakt_color = _TRAKT_STATUS_BITS[self._trakt_configured]
+        sync_subtitle, sync_icon, sync_color = _SYNC_STATUS_BITS[bool(self._enabled)]
+        
+        # 构建数据页面
+        return _render_page({
+            "plex_subtitle": plex_subtitle,
+            "plex_icon": plex_icon,
+            "plex_color": plex_color,
+            "trakt_subtitle": trakt_subtitle,
+            "trakt_icon": trakt_icon,
+            "trakt_color": trakt_color,
+            "last_sync_time": last_sync_time,
+            "sync_subtitle": sync_subtitle,
+            "sync_icon": sync_icon,
+            "sync_color": sync_color,
+            "movies_synced": str(last_stats.get('movies_synced', 0)),
+            "shows_synced": str(last_stats.get('shows_synced', 0)),
+            "episodes_synced": str(last_stats.get('episodes_synced', 0)),
+            "ratings_synced": str(last_stats.get('ratings_synced', 0)),
+            "watched_synced": str(last_stats.get('watched_synced', 0)),
+            "errors": str(errors),
+            "errors_class": "text-h5 text-error" if errors > 0 else "text-h5"
+        })
+
+    def _get_plex_status(self) -> Tuple[bool, str]:
+        """
+        获取 Plex 连接状态，返回 (是否已连接, 显示名称)，结果缓存 _plex_status_ttl 秒
+        """
+        cache = self._plex_status_cache
+        now = time.monotonic()
+        if cache and now - cache[0] < self._plex_status_ttl:
+            return cache[1], cache[2]
+
+        try:
+            mediaserver_helper = _media_server_helper()
+            services = mediaserver_helper.get_services(type_filter="plex")
+            if services:
+                plex_service = list(services.values())[0]
+                if plex_service.instance and not plex_service.instance.is_inactive():
+                    plex_configured = True
+                    plex_host = plex_service.name
+                else:
+                    plex_configured = False
+                    plex_host = "未连接"
+            else:
+                plex_configured = False
+                plex_host = "未配置"
+        except Exception as e:
+            logger.error(f"获取 Plex 配置失败: {str(e)}")
+            plex_configured = False
+            plex_host = "获取失败"
+
+        self._plex_status_cache = (now, plex_configured, plex_host)
+        return plex_configured, plex_host
+
+    def __sync_task(self, force_verify: bool = False):
+        """
+        执行同步任务，同一时间只允许一个同步在运行
+        :param force_verify: 忽略已缓存的验证结果，重新检查依赖包
+        """
+        # 重载配置时旧调度器不等待任务结束，新调度器的立即运行可能与之重叠，直接跳过
+        if not self._sync_running.acquire(blocking=False):
+            logger.warning("已有同步任务正在运行，跳过本次同步")
+            return
+        try:
+            self.__run_sync_task(force_verify)
+        finally:
+            self._sync_running.release()
 
-    def __sync_task(self):
+    def __run_sync_task(self, force_verify: bool = False):
         """
         执行同步任务
+        :param force_verify: 忽略已缓存的验证结果，重新检查依赖包
         """
         logger.info("=" * 60)
         logger.info("开始 Plex Trakt 同步任务")
         logger.info("=" * 60)
 
+        # 依赖已验证过（本进程内或同一 pytrakt 版本），直接执行同步
+        if not force_verify and self.__deps_already_verified():
+            self.__continue_sync_task()
+            return
+
         # 预检查：验证 pytrakt 包是否正确安装
         logger.info("检查依赖包...")
         try:
-            import subprocess
-            import sys
-            
             # 尝试导入并检查
             try:
                 import trakt
-                trakt_path = str(trakt.__file__ if hasattr(trakt, '__file__') else '')
+                trakt_path = str(getattr(trakt, '__file__', ''))
                 logger.info(f"trakt 模块位置: {trakt_path}")
                 
                 # 尝试导入关键函数
                 from trakt.core import delete, get, post
                 logger.info("✓ pytrakt 包验证成功")
+                PlexTraktSync._deps_verified = True
+                self.save_data("deps", {"trakt_version": self.__installed_trakt_version(), "ok": True})
                 
                 # 验证通过，继续执行同步任务
                 self.__continue_sync_task()
@@ -1325,28 +1811,25 @@ class PlexTraktSync(_PluginBase):
                     logger.warning("⚠️ 检测到错误的 trakt 包，尝试自动修复...")
                     
                     try:
-                        # 1. 卸载所有 trakt 相关包
-                        logger.info("步骤 1/3: 卸载错误的包...")
-                        subprocess.run(
-                            [sys.executable, "-m", "pip", "uninstall", "trakt", "trakt.py", "-y"],
-                            capture_output=True,
-                            timeout=30
-                        )
-                        
-                        # 2. 清理缓存
-                        logger.info("步骤 2/3: 清理 pip 缓存...")
+                        # 1. 卸载错误的包：trakt.py 安装的 trakt/core/ 目录会遮蔽 pytrakt 的 trakt/core.py，
+                        #    直接覆盖安装无法修复
+                        logger.info("步骤 1/2: 卸载错误的包...")
                         subprocess.run(
-                            [sys.executable, "-m", "pip", "cache", "purge"],
-                            capture_output=True,
+                            [sys.executable, "-m", "pip", "uninstall", "trakt", "trakt.py", "-y",
+                             "--disable-pip-version-check"],
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL,
                             timeout=30
                         )
                         
-                        # 3. 安装正确的包
-                        logger.info("步骤 3/3: 安装正确的依赖包 (pytrakt==4.2.2)...")
+                        # 2. 安装正确的包（连同 pytrakt 的依赖）
+                        logger.info("步骤 2/2: 安装正确的依赖包 (pytrakt==4.2.2)...")
                         result = subprocess.run(
-                            [sys.executable, "-m", "pip", "install", "--no-cache-dir", 
+                            [sys.executable, "-m", "pip", "install", "--disable-pip-version-check",
                              "PlexAPI==4.17.2", "pytrakt==4.2.2"],
-                            capture_output=True,
+                            # 只在失败时需要 stderr，stdout 的安装进度直接丢弃
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE,
                             text=True,
                             timeout=120
                         )
@@ -1396,6 +1879,93 @@ class PlexTraktSync(_PluginBase):
             logger.error(f"依赖检查失败: {str(e)}")
             return
     
+    def __verify_token(self) -> Tuple[bool, Optional[int], Dict[str, Any]]:
+        """
+        调用 /users/settings 验证 Access Token
+        同一 Token 在 TOKEN_VERIFY_TTL 内验证通过过时直接沿用结果，不再请求
+        :return: (是否有效, HTTP 状态码, 当前用户信息)
+        """
+        verified = PlexTraktSync._verified_token
+        if verified and verified[0] == self._trakt_access_token \
+                and time.monotonic() - verified[1] < TOKEN_VERIFY_TTL:
+            logger.info("✓ Token 最近已验证通过，跳过验证请求")
+            return True, 200, verified[2]
+
+        logger.info("=" * 60)
+        logger.info("🔍 开始 Token 验证测试")
+        logger.info("=" * 60)
+        
+        status_code = None
+        # /users/settings 返回的当前用户信息，后续直接用来构造 Trakt 用户对象
+        settings_user = {}
+        
+        try:
+            logger.info("测试 1: 调用 Trakt API /users/settings")
+            logger.info(f"  - Client ID: {self._trakt_client_id[:20]}...")
+            logger.info(f"  - Token: {self._trakt_access_token[:20]}...")
+            
+            response = self._session.get(
+                'https://api.trakt.tv/users/settings',
+                headers=self._trakt_headers(),
+                timeout=10
+            )
+            status_code = response.status_code
+            
+            logger.info(f"  - HTTP 状态码: {status_code}")
+            
+            if status_code == 200:
+                user_data = _json_loads(response.content)
+                settings_user = user_data.get('user') or {}
+                logger.info(f"✅ Token 有效! 用户: {settings_user.get('username', 'unknown')}")
+                PlexTraktSync._verified_token = (self._trakt_access_token, time.monotonic(), settings_user)
+            elif status_code == 401:
+                logger.error("❌ Token 无效 (401 Unauthorized)")
+                logger.error("   可能原因: Token 已过期或被撤销")
+            elif status_code == 403:
+                logger.error("❌ 访问被拒绝 (403 Forbidden)")
+                logger.error("   可能原因:")
+                logger.error("   1. Client ID 不正确")
+                logger.error("   2. Trakt 应用未批准")
+                logger.error("   3. Token 与 Client ID 不匹配")
+                logger.error(f"   响应内容: {response.text}")
+            else:
+                logger.error(f"❌ 未知错误: {status_code}")
+                logger.error(f"   响应: {response.text}")
+                
+        except Exception as test_err:
+            logger.error(f"❌ Token 测试失败: {str(test_err)}")
+        
+        logger.info("=" * 60)
+        return status_code == 200, status_code, settings_user
+
+    def __deps_already_verified(self) -> bool:
+        """
+        依赖包是否已验证通过：优先看进程内标记，其次比对持久化记录中的 pytrakt 版本，
+        版本一致时仍实际导入一次，导入失败（例如后装的 trakt.py 覆盖了同名模块）则回到完整检查和修复流程
+        """
+        if PlexTraktSync._deps_verified:
+            return True
+        marker = self.get_data("deps")
+        if not marker or not marker.get("ok"):
+            return False
+        version = self.__installed_trakt_version()
+        if not version or marker.get("trakt_version") != version:
+            return False
+        try:
+            from trakt.core import delete, get, post
+        except ImportError:
+            return False
+        PlexTraktSync._deps_verified = True
+        return True
+
+    @staticmethod
+    def __installed_trakt_version() -> Optional[str]:
+        """获取已安装的 pytrakt 版本，未安装时返回 None"""
+        try:
+            return importlib_metadata.version("pytrakt")
+        except importlib_metadata.PackageNotFoundError:
+            return None
+
     def __show_manual_fix_instructions(self):
         """显示手动修复说明"""
         logger.error("")
@@ -1418,6 +1988,9 @@ class PlexTraktSync(_PluginBase):
 
     def __continue_sync_task(self):
         """继续执行同步任务（验证通过后）"""
+        # 复位停止信号，上一次停止插件时设置的信号不影响本次同步
+        self._event.clear()
+
         # 验证配置
         if not self.__validate_config():
             return
@@ -1434,155 +2007,36 @@ class PlexTraktSync(_PluginBase):
             # 先配置 Trakt（必须在导入其他 trakt 模块之前）
             logger.info("正在配置 Trakt 客户端...")
             
-            import os
-            import json
-            import tempfile
-            import requests
-            import sys
-            
             # 🔍 第一步：直接测试 Token 是否有效
-            logger.info("=" * 60)
-            logger.info("🔍 开始 Token 验证测试")
-            logger.info("=" * 60)
-            
-            test_headers = {
-                'Content-Type': 'application/json',
-                'trakt-api-version': '2',
-                'trakt-api-key': self._trakt_client_id,
-                'Authorization': f'Bearer {self._trakt_access_token}'
-            }
-            
-            try:
-                logger.info("测试 1: 调用 Trakt API /users/settings")
-                logger.info(f"  - Client ID: {self._trakt_client_id[:20]}...")
-                logger.info(f"  - Token: {self._trakt_access_token[:20]}...")
-                
-                response = requests.get(
-                    'https://api.trakt.tv/users/settings',
-                    headers=test_headers,
-                    timeout=10
-                )
-                
-                logger.info(f"  - HTTP 状态码: {response.status_code}")
-                
-                if response.status_code == 200:
-                    user_data = response.json()
-                    logger.info(f"✅ Token 有效! 用户: {user_data.get('user', {}).get('username', 'unknown')}")
-                elif response.status_code == 401:
-                    logger.error("❌ Token 无效 (401 Unauthorized)")
-                    logger.error("   可能原因: Token 已过期或被撤销")
-                elif response.status_code == 403:
-                    logger.error("❌ 访问被拒绝 (403 Forbidden)")
-                    logger.error("   可能原因:")
-                    logger.error("   1. Client ID 不正确")
-                    logger.error("   2. Trakt 应用未批准")
-                    logger.error("   3. Token 与 Client ID 不匹配")
-                    logger.error(f"   响应内容: {response.text}")
-                else:
-                    logger.error(f"❌ 未知错误: {response.status_code}")
-                    logger.error(f"   响应: {response.text}")
-                    
-            except Exception as test_err:
-                logger.error(f"❌ Token 测试失败: {str(test_err)}")
-            
-            logger.info("=" * 60)
+            token_valid, status_code, settings_user = self.__verify_token()
             
             # 如果测试失败，不继续
-            if response.status_code != 200:
+            if not token_valid:
                 logger.error("Token 验证失败，请修复后重试")
                 if self._notify:
                     self.post_message(
                         mtype=NotificationType.SiteMessage,
                         title="【Plex Trakt 同步失败】",
-                        text=f"Token 验证失败 (HTTP {response.status_code})\n请检查配置"
+                        text=f"Token 验证失败 (HTTP {status_code})\n请检查配置"
                     )
                 return
             
-            # 🔧 关键修复：确保 trakt 模块未被导入，或清除已导入的模块
+            # 配置 pytrakt：模块只导入一次，凭据未变化时不重复写入
             logger.info("准备配置 pytrakt...")
+            if _configure_trakt(self._trakt_client_id, self._trakt_client_secret,
+                                self._trakt_access_token, self._session):
+                logger.info("✓ Trakt 认证信息已配置")
+                # 凭据变化后其他账号的本地缓存不再使用，直接清理
+                self.__prune_trakt_cache()
+            else:
+                logger.info("✓ Trakt 认证信息未变化，沿用已有配置")
             
-            # 清除可能已经导入的 trakt 模块
-            trakt_modules = [key for key in sys.modules.keys() if key.startswith('trakt')]
-            if trakt_modules:
-                logger.info(f"发现已导入的 trakt 模块: {trakt_modules}")
-                for mod in trakt_modules:
-                    del sys.modules[mod]
-                logger.info("已清除旧的 trakt 模块")
-            
-            # 现在导入 trakt.core 并立即设置变量
-            import trakt.core
-            
-            # 设置认证信息
-            trakt.core.CLIENT_ID = self._trakt_client_id
-            trakt.core.CLIENT_SECRET = self._trakt_client_secret
-            trakt.core.OAUTH_TOKEN = self._trakt_access_token
-            
-            logger.info("✓ Trakt 认证信息已配置")
-            logger.info(f"  验证 - CLIENT_ID 已设置: {bool(trakt.core.CLIENT_ID)}")
-            logger.info(f"  验证 - OAUTH_TOKEN 已设置: {bool(trakt.core.OAUTH_TOKEN)}")
-            
-            # 现在导入其他模块
+            # 导入用户模块（构造 Trakt 用户对象）
             import trakt.users
-            import trakt.movies
-            import trakt.tv
 
-            # 从 MoviePilot MediaServerHelper 获取 Plex 配置
-            logger.info("正在获取 Plex 服务器配置...")
-            try:
-                mediaserver_helper = MediaServerHelper()
-                services = mediaserver_helper.get_services(type_filter="plex")
-                
-                if not services:
-                    error_msg = "未配置 Plex 服务器，请先在 MoviePilot 系统设置中配置媒体服务器"
-                    logger.error(error_msg)
-                    if self._notify:
-                        self.post_message(
-                            mtype=NotificationType.SiteMessage,
-                            title="【Plex Trakt 同步失败】",
-                            text=error_msg
-                        )
-                    return
-                
-                # 获取第一个 Plex 服务器实例
-                plex_service = list(services.values())[0]
-                plex_module = plex_service.instance
-                
-                if not plex_module or plex_module.is_inactive():
-                    error_msg = f"Plex 服务器 {plex_service.name} 未连接，请检查配置"
-                    logger.error(error_msg)
-                    if self._notify:
-                        self.post_message(
-                            mtype=NotificationType.SiteMessage,
-                            title="【Plex Trakt 同步失败】",
-                            text=error_msg
-                        )
-                    return
-                
-                # 获取真正的 PlexServer 对象
-                plex = plex_module.get_plex()
-                if not plex:
-                    error_msg = "无法获取 Plex 服务器对象"
-                    logger.error(error_msg)
-                    if self._notify:
-                        self.post_message(
-                            mtype=NotificationType.SiteMessage,
-                            title="【Plex Trakt 同步失败】",
-                            text=error_msg
-                        )
-                    return
-                
-                logger.info(f"✓ Plex 连接成功: {plex_service.name}")
-                
-            except Exception as plex_err:
-                error_msg = f"获取 Plex 服务器失败: {str(plex_err)}"
-                logger.error(error_msg)
-                if self._notify:
-                    self.post_message(
-                        mtype=NotificationType.SiteMessage,
-                        title="【Plex Trakt 同步失败】",
-                        text=error_msg
-                    )
-                return
+            # Plex 服务器对象在配置验证时已获取，直接复用
+            _, _, plex, plex_name = self._cached_plex
+            logger.info(f"✓ Plex 连接成功: {plex_name}")
             
             if self._trakt_access_token:
                 logger.info(f"✓ 使用 Access Token (前缀: {self._trakt_access_token[:20]}...)")
@@ -1591,11 +2045,21 @@ class PlexTraktSync(_PluginBase):
 
             # 获取 Trakt 用户（仅用于从 Trakt 同步）
             trakt_user = None
+            self._trakt_read_user = None
             if self._sync_from_trakt:
                 # 从 Trakt 同步到 Plex 时必需用户对象
                 try:
                     logger.info("正在连接 Trakt 用户...")
-                    trakt_user = trakt.users.User(self._trakt_username or 'me')
+                    user_info = dict(settings_user)
+                    username = user_info.pop('username', None)
+                    own_user = not self._trakt_username or self._trakt_username in ('me', username)
+                    if username and own_user:
+                        # 预检查已拿到当前用户信息，直接构造，省去一次 /users/<name> 请求
+                        trakt_user = trakt.users.User(username, **user_info)
+                    else:
+                        trakt_user = trakt.users.User(self._trakt_username or 'me')
+                    if not own_user:
+                        self._trakt_read_user = self._trakt_username
                     logger.info(f"✓ Trakt 用户连接成功: {trakt_user.username}")
                 except Exception as e:
                     logger.error(f"✗ 无法连接 Trakt 用户: {str(e)}")
@@ -1629,6 +2093,10 @@ class PlexTraktSync(_PluginBase):
                 logger.warning("没有找到要同步的媒体库")
                 return
 
+            # 需要从 Trakt 拉取数据时，先取一次最后活动时间，未变化的列表直接使用本地缓存
+            if trakt_user:
+                self.__load_trakt_activities()
+
             # 统计信息
             stats = {
                 'movies_synced': 0,
@@ -1640,55 +2108,43 @@ class PlexTraktSync(_PluginBase):
                 'errors': 0
             }
 
-            # 同步每个媒体库
-            for library in libraries:
+            def sync_library(library) -> Dict[str, int]:
+                """同步单个媒体库，统计写入独立的字典，避免线程间争用"""
+                lib_stats = dict.fromkeys(stats, 0)
+                if self._event.is_set():
+                    logger.info(f"插件已停止，跳过媒体库 {library.title}")
+                    return lib_stats
                 logger.info(f"\n处理媒体库: {library.title} ({library.type})")
 
                 if library.type == 'movie' and self._sync_movies:
-                    # 双向同步逻辑
-                    if self._two_way_sync:
-                        logger.info("📊 双向同步模式")
-                        # 先从 Trakt 同步到 Plex
-                        if trakt_user:
-                            logger.info("  第1步: Trakt → Plex")
-                            old_sync_from_trakt = self._sync_from_trakt
-                            self._sync_from_trakt = True
-                            self.__sync_movies(library, trakt_user, stats)
-                            self._sync_from_trakt = old_sync_from_trakt
-                        
-                        # 再从 Plex 同步到 Trakt
-                        logger.info("  第2步: Plex → Trakt")
-                        old_sync_from_trakt = self._sync_from_trakt
-                        self._sync_from_trakt = False
-                        self.__sync_movies(library, trakt_user, stats)
-                        self._sync_from_trakt = old_sync_from_trakt
-                    else:
-                        # 单向同步
-                        self.__sync_movies(library, trakt_user, stats)
-                        
+                    sync_func = self.__sync_movies
                 elif library.type == 'show' and self._sync_shows:
-                    # 双向同步逻辑
-                    if self._two_way_sync:
-                        logger.info("📊 双向同步模式")
-                        # 先从 Trakt 同步到 Plex
-                        if trakt_user:
-                            logger.info("  第1步: Trakt → Plex")
-                            old_sync_from_trakt = self._sync_from_trakt
-                            self._sync_from_trakt = True
-                            self.__sync_shows(library, trakt_user, stats)
-                            self._sync_from_trakt = old_sync_from_trakt
-                        
-                        # 再从 Plex 同步到 Trakt
-                        logger.info("  第2步: Plex → Trakt")
-                        old_sync_from_trakt = self._sync_from_trakt
-                        self._sync_from_trakt = False
-                        self.__sync_shows(library, trakt_user, stats)
-                        self._sync_from_trakt = old_sync_from_trakt
-                    else:
-                        # 单向同步
-                        self.__sync_shows(library, trakt_user, stats)
+                    sync_func = self.__sync_shows
                 else:
                     logger.info(f"跳过媒体库 {library.title} (类型: {library.type})")
+                    return lib_stats
+
+                # 根据配置确定同步方向
+                if self._two_way_sync:
+                    logger.info("📊 双向同步模式")
+                    direction = SYNC_BOTH
+                elif self._sync_from_trakt:
+                    direction = SYNC_TO_PLEX
+                else:
+                    direction = SYNC_TO_TRAKT
+
+                sync_func(library, trakt_user, lib_stats, direction)
+                return lib_stats
+
+            # 各媒体库互不影响，多个媒体库时并行同步
+            if len(libraries) == 1:
+                results = [sync_library(library) for library in libraries]
+            else:
+                with ThreadPoolExecutor(max_workers=min(4, len(libraries))) as executor:
+                    results = list(executor.map(sync_library, libraries))
+            for lib_stats in results:
+                for key, value in lib_stats.items():
+                    stats[key] += value
 
             # 输出统计信息
             logger.info("\n" + "=" * 60)
@@ -1755,9 +2211,13 @@ class PlexTraktSync(_PluginBase):
             logger.error("✗ Trakt 配置不完整，请检查 Client ID 和 Client Secret")
             return False
 
-        # 验证 Plex 配置（从 MoviePilot 系统配置获取）
+        # 验证 Plex 配置（从 MoviePilot 系统配置获取），短时间内复用上次的验证结果
+        if self._cached_plex and time.monotonic() - self._cached_plex[0] < self._cached_plex_ttl \
+                and not self._cached_plex[1].is_inactive():
+            logger.info(f"✓ Plex 配置验证通过: {self._cached_plex[3]}")
+            return True
         try:
-            mediaserver_helper = MediaServerHelper()
+            mediaserver_helper = _media_server_helper()
             services = mediaserver_helper.get_services(type_filter="plex")
             
             if not services:
@@ -1775,7 +2235,9 @@ class PlexTraktSync(_PluginBase):
             if not plex:
                 logger.error(f"✗ 无法获取 Plex 服务器对象")
                 return False
+            _tune_plex_session(plex)
                 
+            self._cached_plex = (time.monotonic(), plex_module, plex, plex_service.name)
             logger.info(f"✓ Plex 配置验证通过: {plex_service.name}")
         except Exception as e:
             logger.error(f"✗ Plex 配置验证失败: {str(e)}")
@@ -1811,59 +2273,244 @@ class PlexTraktSync(_PluginBase):
 
         return libraries
 
-    def __sync_movies(self, library, trakt_user, stats):
+    def _trakt_headers(self) -> Dict[str, str]:
+        """
+        Trakt API 请求头
+        """
+        return {
+            'Content-Type': 'application/json',
+            'trakt-api-version': '2',
+            'trakt-api-key': self._trakt_client_id,
+            'Authorization': f'Bearer {self._trakt_access_token}'
+        }
+
+    def __trakt_cache_dir(self):
+        """
+        Trakt 响应的本地缓存目录，按 Access Token 的哈希区分，切换账号或重新授权后不会读到其他账号的数据
+        """
+        token_hash = hashlib.sha256((self._trakt_access_token or '').encode('utf-8')).hexdigest()[:16]
+        return self.get_data_path() / "trakt_cache" / token_hash
+
+    def __prune_trakt_cache(self):
+        """
+        清理当前 Access Token 以外的 Trakt 本地缓存
+        """
+        current = self.__trakt_cache_dir()
+        if not current.parent.exists():
+            return
+        for entry in current.parent.iterdir():
+            if entry == current:
+                continue
+            try:
+                if entry.is_dir():
+                    shutil.rmtree(entry)
+                else:
+                    entry.unlink()
+            except OSError as e:
+                logger.warning(f"清理 Trakt 缓存失败 {entry.name}: {str(e)}")
+
+    def __trakt_user_path(self, path: str) -> str:
+        """
+        Trakt 用户数据的 API 路径：读取 Token 所属用户时使用 sync/ 接口，
+        配置了其他用户时使用 users/<用户名>/ 接口（响应格式相同，但没有最后活动时间可比对）
+        :param path: 数据路径，如 watched/movies
+        """
+        if self._trakt_read_user:
+            return f"users/{quote(self._trakt_read_user, safe='')}/{path}"
+        return f"sync/{path}"
+
+    def __trakt_get_cached(self, path: str) -> Any:
+        """
+        GET Trakt API，响应体连同 ETag/Last-Modified 缓存到插件数据目录
+        数据未变化（304）时直接返回本地缓存，省去整份列表的下载和解析
+        :param path: API 路径，如 sync/watched/movies
+        """
+        cache_file = self.__trakt_cache_dir() / f"{path.replace('/', '_')}.json"
+        headers = self._trakt_headers()
+        cached = None
+        if cache_file.exists():
+            try:
+                cached = _json_loads(cache_file.read_bytes())
+            except (OSError, ValueError):
+                cached = None
+
+        # Trakt 端最后变更时间与缓存一致时，无需发起请求
+        group, field = TRAKT_ACTIVITY_FIELDS.get(path, (None, None))
+        activity = self._trakt_activities.get(group, {}).get(field) if group else None
+        if cached and activity and cached.get('activity') == activity:
+            logger.info(f"  {path} 自上次同步后无变化，使用本地缓存")
+            return cached.get('data')
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        response = self._session.get(f"https://api.trakt.tv/{path}", headers=headers, timeout=30)
+        if response.status_code == 304 and cached:
+            logger.info(f"  {path} 未变化，使用本地缓存")
+            return cached.get('data')
+        response.raise_for_status()
+        data = _json_loads(response.content)
+
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            # 多个媒体库并行同步时可能同时写同一缓存，临时文件按线程区分
+            tmp_file = cache_file.with_suffix(f".{get_ident()}.tmp")
+            tmp_file.write_bytes(_json_dumps({
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'activity': activity,
+                'data': data
+            }))
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            logger.warning(f"  写入 Trakt 缓存失败: {str(e)}")
+        return data
+
+    def __load_trakt_activities(self):
+        """
+        获取 Trakt 各类数据的最后变更时间，用于判断本地缓存是否仍然有效
+        """
+        try:
+            response = self._session.get(
+                "https://api.trakt.tv/sync/last_activities",
+                headers=self._trakt_headers(),
+                timeout=10
+            )
+            response.raise_for_status()
+            self._trakt_activities = _json_loads(response.content)
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(f"获取 Trakt 最后活动时间失败，将逐个校验缓存: {str(e)}")
+            self._trakt_activities = {}
+
+    @staticmethod
+    def __mark_watched(items: List[Tuple[str, Any]], max_workers: int = 4) -> int:
+        """
+        将 Plex 条目标记为已观看
+        Plex 的 scrobble 接口一次只接受一个条目，改为少量并发提交，并只输出一条汇总日志
+        :param items: (日志名称, Plex 条目)
+        :return: 成功标记的数量
+        """
+        if not items:
+            return 0
+
+        def mark(entry: Tuple[str, Any]) -> bool:
+            title, item = entry
+            try:
+                item.markWatched()
+                logger.debug("  标记为已观看: %s", title)
+                return True
+            except Exception as e:
+                # 不计入错误统计，继续处理其他条目
+                logger.warning(f"  标记失败 {title}: {str(e)}")
+                return False
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+            marked = sum(executor.map(mark, items))
+        logger.info(f"✓ 在 Plex 中标记了 {marked}/{len(items)} 项为已观看")
+        return marked
+
+    def __post_history(self, media_type: str, items: List[dict], batch_size: int) -> Tuple[int, int]:
+        """
+        分批依次提交观看记录到 Trakt sync/history，避免超大请求体
+        某一批失败不影响已成功批次的计数
+        :param media_type: movies / shows（剧集按季和集号提交）
+        :param batch_size: 每批的电影数或单集数
+        :return: (Trakt 实际新增的电影数或单集数, 失败的批次数)
+        """
+        added = failed = 0
+        for chunk in _history_batches(media_type, items, batch_size):
+            try:
+                added += self.__post_history_chunk(media_type, chunk)
+            except Exception as e:
+                failed += 1
+                logger.error(f"批量同步到 Trakt 失败: {str(e)}")
+                status = getattr(getattr(e, 'response', None), 'status_code', None)
+                if status in (401, 403):
+                    # 授权问题后续批次同样会失败，不再继续提交
+                    logger.error("提示: 请确保 Access Token 有效且应用已在 Trakt 授权")
+                    break
+        return added, failed
+
+    def __post_history_chunk(self, media_type: str, chunk: List[dict], max_tries: int = 3) -> int:
+        """
+        提交一批观看记录，遇到 429 限流时按 Retry-After 退避重试
+        （连接池的重试策略不覆盖 POST）
+        插件停止后不再提交尚未开始的批次
+        """
+        if self._event.is_set():
+            return 0
+        for attempt in range(1, max_tries + 1):
+            response = _post_trakt_history(self._session, self._event, {media_type: chunk},
+                                           self._trakt_headers())
+            if response is None:
+                return 0
+            if response.status_code != 429 or attempt == max_tries:
+                break
+            retry_after = response.headers.get('Retry-After', '')
+            delay = int(retry_after) if retry_after.isdigit() else 2 ** attempt
+            logger.warning(f"  Trakt 限流，{delay} 秒后重试 ({attempt}/{max_tries})")
+            if self._event.wait(delay):
+                break
+        response.raise_for_status()
+        # 按剧集提交时 Trakt 返回的新增数量记在 episodes 下
+        added_key = 'episodes' if media_type == 'shows' else media_type
+        return _json_loads(response.content).get('added', {}).get(added_key, 0)
+
+    def __sync_movies(self, library, trakt_user, stats, direction: str):
         """
         同步电影
+        双向同步时只遍历一次媒体库，同时处理 Trakt → Plex 与 Plex → Trakt
+        :param direction: SYNC_TO_PLEX / SYNC_TO_TRAKT / SYNC_BOTH
         """
         try:
-            import trakt.sync
-            from trakt.core import post
-            
-            movies = library.all()
-            total = len(movies)
-            logger.info(f"共找到 {total} 部电影")
+            error_log = _ErrorLog()
+            to_plex = direction != SYNC_TO_TRAKT and trakt_user is not None
+            to_trakt = direction != SYNC_TO_PLEX and self._sync_watched
+            if not to_plex and not to_trakt:
+                return
 
-            # 如果是从 Trakt 同步到 Plex
-            if self._sync_from_trakt and trakt_user:
-                # 获取 Trakt 观看记录
-                watched_movies = {}
-                rated_movies = {}
-                
+            # Plex 电影列表在后台获取，与下面的 Trakt 请求同时进行
+            if to_plex and (to_trakt or self._sync_ratings):
+                movies_future = _run_in_background(
+                    library.all, container_size=PLEX_CONTAINER_SIZE, includeGuids=True)
+            elif to_plex:
+                # 只需把 Trakt 观看记录写回 Plex 时，已观看的电影无事可做，只要未观看的
+                movies_future = _run_in_background(
+                    library.search, unwatched=True, container_size=PLEX_CONTAINER_SIZE, includeGuids=True)
+            else:
+                # 只需同步到 Trakt 时只要已观看的电影，由 Plex 服务端过滤
+                movies_future = _run_in_background(
+                    library.search, unwatched=False, container_size=PLEX_CONTAINER_SIZE, includeGuids=True)
+
+            # 从 Trakt 同步到 Plex：获取 Trakt 观看记录
+            watched_movies = {}
+            rated_movies = {}
+            if to_plex:
                 try:
                     # 直接使用 API 获取观看记录
                     logger.info("正在从 Trakt 获取电影观看记录...")
                     
-                    from trakt.core import get as trakt_get
+                    watched_data = self.__trakt_get_cached(self.__trakt_user_path('watched/movies'))
                     
-                    @trakt_get
-                    def get_watched_movies_data():
-                        """直接调用 API 获取观看数据"""
-                        data = yield 'sync/watched/movies'
-                        yield data
-                    
-                    watched_data = get_watched_movies_data()
-                    
-                    logger.info(f"  API 调用成功，返回数据类型: {type(watched_data)}")
+                    logger.debug("  API 调用成功，返回数据类型: %s", type(watched_data))
                     logger.info(f"  数据长度: {len(watched_data) if watched_data else 0}")
                     
-                    parsed_count = 0  # 初始化计数器
                     if watched_data:
-                        for item in watched_data:
-                            if not isinstance(item, dict):
-                                logger.debug(f"跳过非字典项: {type(item)}")
-                                continue
-                            
-                            movie_data = item.get('movie', {})
-                            movie_ids = movie_data.get('ids', {})
-                            
-                            # 使用多个 ID 作为键
-                            if movie_ids.get('imdb'):
-                                watched_movies[f"imdb://{movie_ids['imdb']}"] = movie_data
-                                parsed_count += 1
-                            if movie_ids.get('tmdb'):
-                                watched_movies[f"tmdb://{movie_ids['tmdb']}"] = movie_data
-                                if 'imdb' not in movie_ids:
-                                    parsed_count += 1
+                        watched_entries = [item.get('movie', {}) for item in watched_data if isinstance(item, dict)]
+                        # 使用多个 ID 作为键（imdb://、tmdb://，与 Plex GUID 格式一致）
+                        watched_movies.update(
+                            (f"{scheme}://{movie_ids[scheme]}", movie_data)
+                            for movie_data in watched_entries
+                            for movie_ids in (movie_data.get('ids', {}),)
+                            for scheme in MOVIE_GUID_SCHEMES
+                            if movie_ids.get(scheme)
+                        )
+                        parsed_count = sum(
+                            1 for movie_data in watched_entries
+                            if any(map(movie_data.get('ids', {}).get, MOVIE_GUID_SCHEMES))
+                        )
                         
                         logger.info(f"  解析完成: {parsed_count} 部电影")
                     else:
@@ -1876,226 +2523,231 @@ class PlexTraktSync(_PluginBase):
                         logger.info("正在从 Trakt 获取电影评分...")
                         
                         try:
-                            # 使用 User.get_ratings() 方法获取评分
-                            ratings_data = trakt_user.get_ratings('movies')
+                            ratings_data = self.__trakt_get_cached(self.__trakt_user_path('ratings/movies'))
                             logger.info(f"  评分数据长度: {len(ratings_data) if ratings_data else 0}")
                         except Exception as rating_err:
                             logger.error(f"  获取评分失败: {str(rating_err)}")
                             ratings_data = None
                         
                         if ratings_data:
-                            for item in ratings_data:
-                                if not isinstance(item, dict):
-                                    continue
-                                
-                                rating = item.get('rating', 0)
-                                movie_data = item.get('movie', {})
-                                movie_ids = movie_data.get('ids', {})
-                                
-                                # Trakt 评分是 1-10，Plex 也是 0-10
-                                plex_rating = float(rating)
-                                
-                                if movie_ids.get('imdb'):
-                                    rated_movies[f"imdb://{movie_ids['imdb']}"] = plex_rating
-                                if movie_ids.get('tmdb'):
-                                    rated_movies[f"tmdb://{movie_ids['tmdb']}"] = plex_rating
+                            # Trakt 评分是 1-10，Plex 也是 0-10
+                            rated_movies.update(
+                                (f"{scheme}://{movie_ids[scheme]}", float(item.get('rating', 0)))
+                                for item in ratings_data if isinstance(item, dict)
+                                for movie_ids in (item.get('movie', {}).get('ids', {}),)
+                                for scheme in MOVIE_GUID_SCHEMES
+                                if movie_ids.get(scheme)
+                            )
                                     
                         logger.info(f"✓ 从 Trakt 获取了 {len(ratings_data) if ratings_data else 0} 个电影评分")
                         
                 except Exception as e:
-                    logger.error(f"获取 Trakt 数据失败: {str(e)}")
-                    import traceback
-                    logger.error(traceback.format_exc())
-                    return
-
-                logger.info(f"开始处理 {total} 部 Plex 电影...")
-                
-                # 遍历 Plex 电影，应用 Trakt 数据
-                for idx, movie in enumerate(movies, 1):
-                    try:
-                        if idx % 10 == 0:
-                            logger.info(f"  处理进度: {idx}/{total}")
-
-                        # 检查 Plex 电影的 GUID
-                        matched_guid = None
-                        for guid in movie.guids:
-                            if guid.id in watched_movies or guid.id in rated_movies:
-                                matched_guid = guid.id
-                                break
-                        
-                        if matched_guid:
-                            # 同步观看状态
-                            if self._sync_watched and matched_guid in watched_movies and not movie.isWatched:
-                                try:
-                                    logger.info(f"  标记为已观看: {movie.title} ({movie.year})")
-                                    movie.markWatched()
-                                    stats['watched_synced'] += 1
-                                    # 添加短暂延迟，避免 Plex 服务器负载过高
-                                    import time
-                                    time.sleep(0.1)
-                                except Exception as mark_err:
-                                    logger.warning(f"  标记失败 {movie.title}: {str(mark_err)}")
-                            
-                            # 同步评分
-                            if self._sync_ratings and matched_guid in rated_movies:
-                                trakt_rating = rated_movies[matched_guid]
-                                current_rating = movie.userRating if hasattr(movie, 'userRating') else None
-                                
-                                # 只在评分不同时更新
-                                if current_rating != trakt_rating:
-                                    logger.info(f"  更新评分: {movie.title} - {trakt_rating}/10")
-                                    movie.rate(trakt_rating)
-                                    stats['ratings_synced'] += 1
-                            
-                            stats['movies_synced'] += 1
+                    logger.error(f"获取 Trakt 数据失败: {str(e)}", exc_info=True)
+                    if not to_trakt:
+                        return
+                    # 双向同步时仍继续 Plex → Trakt
+                    to_plex = False
 
-                    except Exception as e:
-                        logger.error(f"处理电影失败 {movie.title}: {str(e)}")
-                        stats['errors'] += 1
+            movies = movies_future.result()
+            total = len(movies)
+            logger.info(f"共找到 {total} 部电影")
+            logger.info(f"开始处理 {total} 部 Plex 电影...")
             
-            # 如果是从 Plex 同步到 Trakt（批量同步）
-            else:
-                if not self._sync_watched:
-                    return
-                
-                # 收集要同步的电影
-                movies_to_sync = []
-                for idx, movie in enumerate(movies, 1):
-                    try:
-                        if idx % 10 == 0:
-                            logger.info(f"  处理进度: {idx}/{total}")
-
-                        if movie.isWatched:
-                            # 获取 IMDB/TMDB ID
-                            movie_ids = self.__extract_ids(movie)
-                            
-                            if movie_ids.get('imdb'):
-                                movies_to_sync.append({
-                                    'ids': {'imdb': movie_ids['imdb']},
-                                    'title': movie.title,
-                                    'year': movie.year
-                                })
-                            elif movie_ids.get('tmdb'):
-                                movies_to_sync.append({
-                                    'ids': {'tmdb': int(movie_ids['tmdb'])},
-                                    'title': movie.title,
-                                    'year': movie.year
-                                })
-
-                    except Exception as e:
-                        logger.error(f"处理电影失败 {movie.title}: {str(e)}")
-                        stats['errors'] += 1
+            # 观看记录和评分按 GUID 合并成一个索引：GUID -> (Trakt 已观看, Trakt 评分)，每个 GUID 只查一次字典
+            trakt_index = {
+                guid: (guid in watched_movies, rated_movies.get(guid))
+                for guid in watched_movies.keys() | rated_movies.keys()
+            }
+            # 需要写回 Plex 的变更，扫描完成后统一提交
+            to_mark_watched = []
+            to_rate = []
+            # 需要同步到 Trakt 的电影
+            movies_to_sync = []
+            
+            for idx, movie in enumerate(movies, 1):
+                try:
+                    if idx % PROGRESS_LOG_INTERVAL == 0:
+                        logger.info("  处理进度: %d/%d", idx, total)
 
-                # 批量同步到 Trakt
-                if movies_to_sync:
-                    try:
-                        logger.info(f"正在批量同步 {len(movies_to_sync)} 部电影到 Trakt...")
+                    # 在 Plex 中已观看的电影，同步到 Trakt（以扫描时的状态为准，刚从 Trakt 标记的不回传）
+                    if to_trakt and movie.isWatched:
+                        # 获取 IMDB/TMDB ID
+                        movie_ids = self.__extract_ids(movie)
                         
-                        # 使用 Trakt Sync API 批量添加历史记录
-                        response = post('sync/history', {
-                            'movies': movies_to_sync
-                        })
+                        if movie_ids.get('imdb'):
+                            movies_to_sync.append({
+                                'ids': {'imdb': movie_ids['imdb']},
+                                'title': movie.title,
+                                'year': movie.year
+                            })
+                        elif movie_ids.get('tmdb'):
+                            movies_to_sync.append({
+                                'ids': {'tmdb': int(movie_ids['tmdb'])},
+                                'title': movie.title,
+                                'year': movie.year
+                            })
+
+                    if not to_plex:
+                        continue
+
+                    # 检查 Plex 电影的 GUID，应用 Trakt 数据
+                    matched = trakt_watched = False
+                    trakt_rating = None
+                    for guid_id in _plex_guid_ids(movie):
+                        trakt_entry = trakt_index.get(guid_id)
+                        if trakt_entry:
+                            matched = True
+                            trakt_watched = trakt_watched or trakt_entry[0]
+                            if trakt_rating is None:
+                                trakt_rating = trakt_entry[1]
+                    
+                    if matched:
+                        # 同步观看状态
+                        if self._sync_watched and trakt_watched and not movie.isWatched:
+                            to_mark_watched.append(movie)
                         
-                        if response and 'added' in response:
-                            added = response['added'].get('movies', 0)
-                            logger.info(f"✓ 成功同步 {added} 部电影到 Trakt")
-                            stats['movies_synced'] = added
-                            stats['watched_synced'] += added
-                        else:
-                            logger.warning(f"同步响应异常: {response}")
+                        # 同步评分
+                        if self._sync_ratings and trakt_rating is not None:
+                            current_rating = getattr(movie, 'userRating', None)
                             
-                    except Exception as e:
-                        logger.error(f"批量同步到 Trakt 失败: {str(e)}")
-                        if 'Forbidden' in str(e):
-                            logger.error("提示: 请确保 Access Token 有效且应用已在 Trakt 授权")
-                        stats['errors'] += 1
+                            # 只在评分不同时更新
+                            if current_rating != trakt_rating:
+                                to_rate.append((movie, trakt_rating))
+                        
+                        stats['movies_synced'] += 1
+
+                except Exception as e:
+                    error_log.error("处理电影失败 %s: %s", movie.title, e)
+                    stats['errors'] += 1
+
+            # 统一写回观看状态和评分，不再逐部电影等待
+            stats['watched_synced'] += self.__mark_watched(
+                [(f"{movie.title} ({movie.year})", movie) for movie in to_mark_watched])
+            rated = 0
+            for movie, trakt_rating in to_rate:
+                try:
+                    logger.debug("  更新评分: %s - %s/10", movie.title, trakt_rating)
+                    movie.rate(trakt_rating)
+                    rated += 1
+                except Exception as e:
+                    error_log.error("处理电影失败 %s: %s", movie.title, e)
+                    stats['errors'] += 1
+            if to_rate:
+                logger.info(f"✓ 在 Plex 中更新了 {rated}/{len(to_rate)} 个电影评分")
+            stats['ratings_synced'] += rated
+
+            # 批量同步到 Trakt
+            if movies_to_sync:
+                logger.info(f"正在批量同步 {len(movies_to_sync)} 部电影到 Trakt...")
+                
+                # 使用 Trakt Sync API 分批添加历史记录，失败的批次计入错误，成功的照常统计
+                added, failed = self.__post_history('movies', movies_to_sync, self._batch_size)
+                logger.info(f"✓ 成功同步 {added} 部电影到 Trakt")
+                stats['movies_synced'] += added
+                stats['watched_synced'] += added
+                stats['errors'] += failed
 
         except Exception as e:
             logger.error(f"同步电影库失败: {str(e)}")
             stats['errors'] += 1
 
-    def __sync_shows(self, library, trakt_user, stats):
+    def __sync_shows(self, library, trakt_user, stats, direction: str,
+                     shows_future: Optional[Future] = None):
         """
         同步剧集
+        :param direction: SYNC_TO_PLEX / SYNC_TO_TRAKT / SYNC_BOTH
+        :param shows_future: 已在获取的 Plex 剧集列表，双向同步的两步之间共用
         """
+        if direction == SYNC_BOTH:
+            # 剧集两个方向的数据结构差异较大，仍分两步执行，剧集列表只获取一次；
+            # 第2步的单集仍从 Plex 重新查询，第1步刚标记的观看状态不会因本地对象未刷新而漏掉
+            shows_future = _run_in_background(
+                library.all, container_size=PLEX_CONTAINER_SIZE, includeGuids=True)
+            if trakt_user:
+                logger.info("  第1步: Trakt → Plex")
+                self.__sync_shows(library, trakt_user, stats, SYNC_TO_PLEX, shows_future=shows_future)
+            logger.info("  第2步: Plex → Trakt")
+            self.__sync_shows(library, trakt_user, stats, SYNC_TO_TRAKT, shows_future=shows_future)
+            return
+
+        error_log = _ErrorLog()
         try:
-            from trakt.core import post
-            
-            shows = library.all()
-            total = len(shows)
-            logger.info(f"共找到 {total} 部剧集")
+            # Plex 剧集列表在后台获取，与 Trakt 请求或已观看单集列表同时进行
+            if shows_future is None:
+                shows_future = _run_in_background(
+                    library.all, container_size=PLEX_CONTAINER_SIZE, includeGuids=True)
+
+            def load_shows() -> Tuple[list, int]:
+                result = shows_future.result()
+                logger.info(f"共找到 {len(result)} 部剧集")
+                return result, len(result)
 
             # 如果是从 Trakt 同步到 Plex
-            if self._sync_from_trakt and trakt_user:
+            if direction == SYNC_TO_PLEX and trakt_user:
                 # 获取 Trakt 观看记录和评分
                 watched_shows = {}
                 rated_shows = {}
                 rated_episodes = {}
+                # 剧集所有 ID 形式的 GUID -> 上面三个字典使用的主键
+                guid_to_trakt_key = {}
+
+                def add_aliases(show_ids: dict, show_key: str):
+                    for scheme in SHOW_GUID_SCHEMES:
+                        if show_ids.get(scheme):
+                            guid_to_trakt_key.setdefault(f"{scheme}://{show_ids[scheme]}", show_key)
                 
                 try:
                     logger.info("正在从 Trakt 获取剧集观看记录...")
                     
                     # 注意：get_watched 返回的是 TVShow 对象列表，不是原始字典
-                    # 我们需要直接使用 API 来获取完整的观看数据
-                    from trakt.core import get as trakt_get
-                    
-                    @trakt_get
-                    def get_watched_shows_data():
-                        """直接调用 API 获取完整的观看数据（包含季和集信息）"""
-                        data = yield 'sync/watched/shows'
-                        yield data
-                    
-                    watched_data = get_watched_shows_data()
+                    # 直接请求 API 获取完整的观看数据（包含季和集信息）
+                    # 观看记录与剧集、单集评分互不依赖，并发请求
+                    paths = [self.__trakt_user_path('watched/shows')]
+                    if self._sync_ratings:
+                        paths += [self.__trakt_user_path('ratings/shows'), self.__trakt_user_path('ratings/episodes')]
+                    with ThreadPoolExecutor(max_workers=len(paths)) as executor:
+                        watched_data, *ratings_responses = executor.map(self.__trakt_get_cached, paths)
                     
-                    logger.info(f"调试 - watched_data 类型: {type(watched_data)}")
-                    logger.info(f"调试 - watched_data 长度: {len(watched_data) if watched_data else 0}")
+                    logger.debug("调试 - watched_data 类型: %s", type(watched_data))
+                    logger.info(f"  数据长度: {len(watched_data) if watched_data else 0}")
                     
                     if watched_data:
                         # 显示第一项的结构用于调试
                         if len(watched_data) > 0:
                             first_item = watched_data[0]
-                            logger.info(f"调试 - 第一项类型: {type(first_item)}")
-                            logger.info(f"调试 - 第一项键: {first_item.keys() if isinstance(first_item, dict) else 'Not a dict'}")
+                            logger.debug("调试 - 第一项类型: %s", type(first_item))
+                            logger.debug("调试 - 第一项键: %s",
+                                         first_item.keys() if isinstance(first_item, dict) else 'Not a dict')
                         
                         parsed_count = 0
                         for item in watched_data:
                             # item 应该是字典，包含 'show' 和 'seasons' 信息
                             if not isinstance(item, dict):
-                                logger.debug(f"跳过非字典项: {type(item)}")
+                                logger.debug("跳过非字典项: %s", type(item))
                                 continue
                                 
                             show_data = item.get('show', {})
                             seasons_data = item.get('seasons', [])
                             
                             if not show_data or not seasons_data:
-                                logger.debug(f"跳过不完整的项: show={bool(show_data)}, seasons={bool(seasons_data)}")
+                                logger.debug("跳过不完整的项: show=%s, seasons=%s", bool(show_data), bool(seasons_data))
                                 continue
                             
                             # 获取 show IDs
                             show_ids = show_data.get('ids', {})
-                            show_key = None
-                            
-                            if show_ids.get('tvdb'):
-                                show_key = f"tvdb://{show_ids['tvdb']}"
-                            elif show_ids.get('tmdb'):
-                                show_key = f"tmdb://{show_ids['tmdb']}"
-                            elif show_ids.get('imdb'):
-                                show_key = f"imdb://{show_ids['imdb']}"
+                            show_key = _primary_guid(show_ids, SHOW_GUID_SCHEMES)
                             
                             if show_key:
-                                # 收集所有已观看的集
-                                watched_episodes = set()
-                                for season_data in seasons_data:
-                                    season_num = season_data.get('number', 0)
-                                    episodes = season_data.get('episodes', [])
-                                    for ep_data in episodes:
-                                        ep_num = ep_data.get('number', 0)
-                                        watched_episodes.add(f"S{season_num:02d}E{ep_num:02d}")
+                                # 收集所有已观看的集，构建后只读
+                                watched_episodes = frozenset(
+                                    _episode_key(season_data.get('number', 0), ep_data.get('number', 0))
+                                    for season_data in seasons_data
+                                    for ep_data in season_data.get('episodes', ())
+                                )
                                 
-                                watched_shows[show_key] = {
-                                    'show': show_data,
-                                    'episodes': watched_episodes
-                                }
+                                # 只保留单集集合，Trakt 剧集元数据在 Plex 侧用不到
+                                watched_shows[show_key] = watched_episodes
+                                add_aliases(show_ids, show_key)
                                 parsed_count += 1
                                 
                         logger.info(f"✓ 从 Trakt 获取了 {len(watched_shows)} 部已观看剧集")
@@ -2103,10 +2755,10 @@ class PlexTraktSync(_PluginBase):
                         # 显示几个示例用于调试
                         if watched_shows:
                             sample_count = 0
-                            for show_key, show_info in watched_shows.items():
+                            for show_key, episodes in watched_shows.items():
                                 if sample_count < 3:
-                                    ep_count = len(show_info['episodes'])
-                                    logger.info(f"  示例: {show_key} - {ep_count} 集已观看")
+                                    ep_count = len(episodes)
+                                    logger.debug("  示例: %s - %s 集已观看", show_key, ep_count)
                                     sample_count += 1
                                 else:
                                     break
@@ -2115,8 +2767,9 @@ class PlexTraktSync(_PluginBase):
                     if self._sync_ratings:
                         logger.info("正在从 Trakt 获取剧集评分...")
                         
-                        # 获取剧集评分
-                        show_ratings_data = trakt_user.get_ratings('shows')
+                        show_ratings_data, episode_ratings_data = ratings_responses
+                        
+                        # 解析剧集评分
                         if show_ratings_data:
                             for item in show_ratings_data:
                                 if not isinstance(item, dict):
@@ -2126,15 +2779,12 @@ class PlexTraktSync(_PluginBase):
                                 show_data = item.get('show', {})
                                 show_ids = show_data.get('ids', {})
                                 
-                                plex_rating = float(rating)
-                                
-                                if show_ids.get('tvdb'):
-                                    rated_shows[f"tvdb://{show_ids['tvdb']}"] = plex_rating
-                                elif show_ids.get('tmdb'):
-                                    rated_shows[f"tmdb://{show_ids['tmdb']}"] = plex_rating
+                                show_key = _primary_guid(show_ids, SHOW_GUID_SCHEMES)
+                                if show_key:
+                                    rated_shows[show_key] = float(rating)
+                                    add_aliases(show_ids, show_key)
                         
-                        # 获取单集评分
-                        episode_ratings_data = trakt_user.get_ratings('episodes')
+                        # 解析单集评分
                         if episode_ratings_data:
                             for item in episode_ratings_data:
                                 if not isinstance(item, dict):
@@ -2147,171 +2797,192 @@ class PlexTraktSync(_PluginBase):
                                 
                                 season_num = episode_data.get('season', 0)
                                 ep_num = episode_data.get('number', 0)
-                                ep_key = f"S{season_num:02d}E{ep_num:02d}"
+                                ep_key = _episode_key(season_num, ep_num)
                                 
-                                plex_rating = float(rating)
-                                
-                                if show_ids.get('tvdb'):
-                                    show_key = f"tvdb://{show_ids['tvdb']}"
-                                    if show_key not in rated_episodes:
-                                        rated_episodes[show_key] = {}
-                                    rated_episodes[show_key][ep_key] = plex_rating
-                                elif show_ids.get('tmdb'):
-                                    show_key = f"tmdb://{show_ids['tmdb']}"
-                                    if show_key not in rated_episodes:
-                                        rated_episodes[show_key] = {}
-                                    rated_episodes[show_key][ep_key] = plex_rating
+                                show_key = _primary_guid(show_ids, SHOW_GUID_SCHEMES)
+                                if show_key:
+                                    show_episode_ratings = rated_episodes.get(show_key)
+                                    if show_episode_ratings is None:
+                                        show_episode_ratings = rated_episodes[show_key] = {}
+                                        add_aliases(show_ids, show_key)
+                                    show_episode_ratings[ep_key] = float(rating)
                         
                         logger.info(f"✓ 从 Trakt 获取了 {len(show_ratings_data) if show_ratings_data else 0} 个剧集评分和 {sum(len(eps) for eps in rated_episodes.values())} 个单集评分")
                     
-                    # 调试：显示前几个
-                    if watched_shows:
-                        sample_keys = list(watched_shows.keys())[:2]
-                        for key in sample_keys:
-                            ep_count = len(watched_shows[key]['episodes'])
-                            logger.info(f"  示例: {key} - {ep_count} 集已观看")
-                    
                 except Exception as e:
-                    logger.error(f"获取 Trakt 观看记录失败: {str(e)}")
-                    import traceback
-                    logger.error(traceback.format_exc())
+                    logger.error(f"获取 Trakt 观看记录失败: {str(e)}", exc_info=True)
                     return
 
+                # 三类 Trakt 数据按剧集 GUID 合并成一个索引：GUID -> (已观看单集, 剧集评分, 单集评分)
+                trakt_index = {
+                    key: (
+                        watched_shows.get(key, frozenset()),
+                        rated_shows.get(key),
+                        rated_episodes.get(key, {})
+                    )
+                    for key in watched_shows.keys() | rated_shows.keys() | rated_episodes.keys()
+                }
+                # 剧集的其他 ID 也指向同一条记录，Plex 只有 tmdb/imdb GUID 时同样能匹配
+                trakt_index.update({
+                    alias: trakt_index[key] for alias, key in guid_to_trakt_key.items()
+                    if key in trakt_index and alias not in trakt_index
+                })
+                # 需要在 Plex 中标记为已观看的单集，扫描完成后统一提交
+                to_mark_watched = []
+                
                 # 遍历 Plex 剧集，应用 Trakt 数据
+                shows, total = load_shows()
+                ratings_before = stats['ratings_synced']
                 for idx, show in enumerate(shows, 1):
                     try:
-                        if idx % 10 == 0:
-                            logger.info(f"  处理进度: {idx}/{total}")
+                        if idx % PROGRESS_LOG_INTERVAL == 0:
+                            logger.info("  处理进度: %d/%d", idx, total)
 
                         # 检查 Plex 剧集的 GUID
-                        matched_show_key = None
-                        for guid in show.guids:
-                            if guid.id in watched_shows or guid.id in rated_shows or guid.id in rated_episodes:
-                                matched_show_key = guid.id
+                        trakt_entry = None
+                        for guid_id in _plex_guid_ids(show):
+                            trakt_entry = trakt_index.get(guid_id)
+                            if trakt_entry:
                                 break
                         
-                        if matched_show_key:
+                        if trakt_entry:
+                            watched_episodes, show_rating, episode_ratings = trakt_entry
+                            
                             # 同步剧集整体评分
-                            if self._sync_ratings and matched_show_key in rated_shows:
+                            if self._sync_ratings and show_rating is not None:
                                 try:
-                                    trakt_rating = rated_shows[matched_show_key]
-                                    current_rating = show.userRating if hasattr(show, 'userRating') else None
+                                    trakt_rating = show_rating
+                                    current_rating = getattr(show, 'userRating', None)
                                     
                                     if current_rating != trakt_rating:
-                                        logger.info(f"  更新剧集评分: {show.title} - {trakt_rating}/10")
+                                        logger.debug("  更新剧集评分: %s - %s/10", show.title, trakt_rating)
                                         show.rate(trakt_rating)
                                         stats['ratings_synced'] += 1
                                 except Exception as e:
-                                    logger.debug(f"  剧集评分同步失败: {str(e)}")
+                                    logger.debug("  剧集评分同步失败: %s", e)
                             
                             # 同步观看状态和单集评分
-                            watched_episodes = watched_shows.get(matched_show_key, {}).get('episodes', set())
-                            episode_ratings = rated_episodes.get(matched_show_key, {})
+                            # 没有需要处理的单集时不请求单集列表：Trakt 没有观看记录或 Plex 中已全部看完，且没有单集评分
+                            need_watched = self._sync_watched and watched_episodes and (
+                                show.leafCount is None or (show.viewedLeafCount or 0) < show.leafCount)
+                            need_ratings = self._sync_ratings and episode_ratings
+                            if not (need_watched or need_ratings):
+                                stats['shows_synced'] += 1
+                                continue
+                            
+                            # 一次请求取回全部单集（allLeaves），不再逐季请求
+                            episodes = show.episodes()
+                            if not need_ratings:
+                                # 只需同步观看状态：跳过评分分支
+                                for episode in episodes:
+                                    if episode.isWatched:
+                                        continue
+                                    ep_key = _episode_key(episode.seasonNumber, episode.index)
+                                    if ep_key in watched_episodes:
+                                        to_mark_watched.append((show.title, ep_key, episode))
+                                stats['shows_synced'] += 1
+                                continue
                             
-                            # 遍历所有季和集
-                            for season in show.seasons():
-                                for episode in season.episodes():
-                                    ep_key = f"S{episode.seasonNumber:02d}E{episode.index:02d}"
+                            for episode in episodes:
+                                ep_key = _episode_key(episode.seasonNumber, episode.index)
                                     
-                                    # 同步观看状态
-                                    if self._sync_watched and ep_key in watched_episodes and not episode.isWatched:
-                                        try:
-                                            import time
-                                            logger.info(f"  标记为已观看: {show.title} {ep_key}")
-                                            episode.markWatched()
-                                            stats['watched_synced'] += 1
-                                            stats['episodes_synced'] += 1
-                                            # 添加短暂延迟，避免 Plex 服务器负载过高
-                                            time.sleep(0.1)
-                                        except Exception as mark_err:
-                                            logger.warning(f"  标记失败 {show.title} {ep_key}: {str(mark_err)}")
-                                            # 不计入错误统计，继续处理其他集
+                                # 同步观看状态
+                                if need_watched and ep_key in watched_episodes and not episode.isWatched:
+                                    to_mark_watched.append((show.title, ep_key, episode))
                                     
-                                    # 同步单集评分
-                                    if self._sync_ratings and ep_key in episode_ratings:
-                                        try:
-                                            trakt_rating = episode_ratings[ep_key]
-                                            current_rating = episode.userRating if hasattr(episode, 'userRating') else None
+                                # 同步单集评分
+                                if ep_key in episode_ratings:
+                                    try:
+                                        trakt_rating = episode_ratings[ep_key]
+                                        current_rating = getattr(episode, 'userRating', None)
                                             
-                                            if current_rating != trakt_rating:
-                                                logger.info(f"  更新单集评分: {show.title} {ep_key} - {trakt_rating}/10")
-                                                episode.rate(trakt_rating)
-                                                stats['ratings_synced'] += 1
-                                        except Exception as e:
-                                            logger.debug(f"  单集评分同步失败: {str(e)}")
+                                        if current_rating != trakt_rating:
+                                            logger.debug("  更新单集评分: %s %s - %s/10",
+                                                         show.title, _episode_label(ep_key), trakt_rating)
+                                            episode.rate(trakt_rating)
+                                            stats['ratings_synced'] += 1
+                                    except Exception as e:
+                                        logger.debug("  单集评分同步失败: %s", e)
                             
                             stats['shows_synced'] += 1
 
                     except Exception as e:
-                        logger.error(f"处理剧集失败 {show.title}: {str(e)}")
+                        error_log.error("处理剧集失败 %s: %s", show.title, e)
                         stats['errors'] += 1
+
+                if stats['ratings_synced'] > ratings_before:
+                    logger.info(f"✓ 在 Plex 中更新了 {stats['ratings_synced'] - ratings_before} 个剧集/单集评分")
+
+                # 统一写回观看状态，不再逐集等待
+                marked = self.__mark_watched(
+                    [(f"{show_title} {_episode_label(ep_key)}", episode)
+                     for show_title, ep_key, episode in to_mark_watched])
+                stats['watched_synced'] += marked
+                stats['episodes_synced'] += marked
             
             # 如果是从 Plex 同步到 Trakt（批量同步）
             else:
                 if not self._sync_watched:
                     return
                 
-                # 收集要同步的剧集
-                episodes_to_sync = []
+                # 整个库已观看的单集分页一次取回，按所属剧集分组，不再逐部剧集请求单集列表
+                watched_by_show: Dict[Any, list] = {}
+                for episode in library.searchEpisodes(
+                        unwatched=False, container_size=PLEX_CONTAINER_SIZE):
+                    watched_by_show.setdefault(episode.grandparentRatingKey, []).append(episode)
+                
+                # 收集要同步的剧集，按剧集分组：剧集 ID 每部只处理一次，单集只需季号和集号
+                shows_to_sync = []
+                episode_count = 0
+                shows, total = load_shows()
                 for idx, show in enumerate(shows, 1):
                     try:
-                        if idx % 10 == 0:
-                            logger.info(f"  处理进度: {idx}/{total}")
+                        if idx % PROGRESS_LOG_INTERVAL == 0:
+                            logger.info("  处理进度: %d/%d", idx, total)
 
+                        # Plex 中一集都没看过的剧集无需获取 ID 和单集列表（双向同步时以第1步获取时的状态为准）
+                        if not show.viewedLeafCount:
+                            continue
+                        
                         # 获取 TVDB/TMDB ID
                         show_ids = self.__extract_ids(show)
                         
-                        if show_ids.get('tvdb') or show_ids.get('tmdb'):
-                            has_watched = False
-                            
-                            # 遍历所有季和集
-                            for season in show.seasons():
-                                for episode in season.episodes():
-                                    if episode.isWatched:
-                                        ep_data = {
-                                            'season': episode.seasonNumber,
-                                            'number': episode.index
-                                        }
-                                        
-                                        # 添加剧集 ID
-                                        if show_ids.get('tvdb'):
-                                            ep_data['ids'] = {'tvdb': int(show_ids['tvdb'])}
-                                        elif show_ids.get('tmdb'):
-                                            ep_data['ids'] = {'tmdb': int(show_ids['tmdb'])}
-                                        
-                                        episodes_to_sync.append(ep_data)
-                                        has_watched = True
-                            
-                            if has_watched:
-                                stats['shows_synced'] += 1
+                        if show_ids.get('tvdb'):
+                            trakt_ids = {'tvdb': int(show_ids['tvdb'])}
+                        elif show_ids.get('tmdb'):
+                            trakt_ids = {'tmdb': int(show_ids['tmdb'])}
+                        else:
+                            continue
+                        
+                        episodes = watched_by_show.get(show.ratingKey, ())
+                        seasons: Dict[int, list] = {}
+                        for episode in episodes:
+                            if episode.isWatched:
+                                seasons.setdefault(episode.seasonNumber, []).append({'number': episode.index})
+                        
+                        if seasons:
+                            shows_to_sync.append({
+                                'ids': trakt_ids,
+                                'seasons': [{'number': number, 'episodes': season_episodes}
+                                            for number, season_episodes in seasons.items()]
+                            })
+                            episode_count += sum(map(len, seasons.values()))
+                            stats['shows_synced'] += 1
 
                     except Exception as e:
-                        logger.error(f"处理剧集失败 {show.title}: {str(e)}")
+                        error_log.error("处理剧集失败 %s: %s", show.title, e)
                         stats['errors'] += 1
 
                 # 批量同步到 Trakt
-                if episodes_to_sync:
-                    try:
-                        logger.info(f"正在批量同步 {len(episodes_to_sync)} 集到 Trakt...")
-                        
-                        # 使用 Trakt Sync API 批量添加历史记录
-                        response = post('sync/history', {
-                            'episodes': episodes_to_sync
-                        })
-                        
-                        if response and 'added' in response:
-                            added = response['added'].get('episodes', 0)
-                            logger.info(f"✓ 成功同步 {added} 集到 Trakt")
-                            stats['episodes_synced'] = added
-                            stats['watched_synced'] += added
-                        else:
-                            logger.warning(f"同步响应异常: {response}")
-                            
-                    except Exception as e:
-                        logger.error(f"批量同步到 Trakt 失败: {str(e)}")
-                        if 'Forbidden' in str(e):
-                            logger.error("提示: 请确保 Access Token 有效且应用已在 Trakt 授权")
-                        stats['errors'] += 1
+                if shows_to_sync:
+                    logger.info(f"正在批量同步 {len(shows_to_sync)} 部剧集共 {episode_count} 集到 Trakt...")
+                    
+                    # 使用 Trakt Sync API 按批量处理大小分批依次添加历史记录，失败的批次计入错误
+                    added, failed = self.__post_history('shows', shows_to_sync, self._batch_size)
+                    logger.info(f"✓ 成功同步 {added} 集到 Trakt")
+                    stats['episodes_synced'] += added
+                    stats['watched_synced'] += added
+                    stats['errors'] += failed
 
         except Exception as e:
             logger.error(f"同步剧集库失败: {str(e)}")
@@ -2320,26 +2991,33 @@ class PlexTraktSync(_PluginBase):
     def __extract_ids(self, item) -> dict:
         """
         从 Plex 媒体项提取外部 ID
+        结果按 (ratingKey, guid) 缓存，重新匹配后 guid 变化，缓存自然失效；
+        没有提取到 ID 的条目不缓存，代理修正后下次可以重新解析
         """
+        cache_key = (item.ratingKey, item.guid)
+        cache = self._external_ids_cache
+        with self._external_ids_lock:
+            ids = cache.get(cache_key)
+            if ids is not None:
+                cache.move_to_end(cache_key)
+                return ids
         ids = {}
         
         try:
-            # 遍历所有 GUID
-            for guid in item.guids:
-                guid_id = guid.id.lower()
-                
-                # 提取 IMDB ID
-                if 'imdb://' in guid_id:
-                    ids['imdb'] = guid_id.replace('imdb://', '')
-                # 提取 TMDB ID
-                elif 'tmdb://' in guid_id:
-                    ids['tmdb'] = guid_id.replace('tmdb://', '')
-                # 提取 TVDB ID
-                elif 'tvdb://' in guid_id:
-                    ids['tvdb'] = guid_id.replace('tvdb://', '')
+            # 遍历所有 GUID，格式均为 scheme://id
+            for guid_id in _plex_guid_ids(item):
+                scheme, sep, value = guid_id.partition('://')
+                if sep and scheme in GUID_SCHEMES:
+                    ids[scheme] = value
         except Exception as e:
-            logger.debug(f"提取 ID 失败: {str(e)}")
+            logger.debug("提取 ID 失败: %s", e)
+            return ids
         
+        if ids:
+            with self._external_ids_lock:
+                cache[cache_key] = ids
+                if len(cache) > self._external_ids_cache_size:
+                    cache.popitem(last=False)
         return ids
 
     def stop_service(self):
@@ -2350,9 +3028,9 @@ class PlexTraktSync(_PluginBase):
             if self._scheduler:
                 self._scheduler.remove_all_jobs()
                 if self._scheduler.running:
+                    # 通知正在进行的同步在当前步骤结束后退出，下次同步开始时复位
                     self._event.set()
                     self._scheduler.shutdown(wait=False)
-                    self._event.clear()
                 self._scheduler = None
                 logger.info("Plex Trakt 同步服务已停止")
         except Exception as e: